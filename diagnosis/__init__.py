@@ -0,0 +1,27 @@
+"""Headless computer fault diagnosis core.
+
+Importable without tkinter; the Tk GUI lives in ``douaakriba.py``.
+"""
+from .cache import ResultCache, cached_diagnose
+from .catalog import SYMPTOMS, SYMPTOM_NAMES
+from .core import DiagnosisCancelled, diagnose
+from .knowledge import ComputerDiagnosis, rules_fingerprint
+from .pool import EnginePool, default_pool
+from .profiling import RuleProfiler
+from .results import Diagnosis, DiagnosisResult
+
+__all__ = [
+    "ComputerDiagnosis",
+    "Diagnosis",
+    "DiagnosisCancelled",
+    "DiagnosisResult",
+    "EnginePool",
+    "ResultCache",
+    "RuleProfiler",
+    "SYMPTOMS",
+    "SYMPTOM_NAMES",
+    "cached_diagnose",
+    "default_pool",
+    "diagnose",
+    "rules_fingerprint",
+]
@@ -0,0 +1,121 @@
+"""Goal-driven backward chaining over the compiled rules.
+
+Starting from a target diagnosis ("RAM Failure", "Overheating", ...) the
+chainer walks back through the antecedents of the rules that conclude it
+and asks for symptoms one at a time through a callback. Conjunctions stop
+at the first false literal, disjunctions at the first true branch, so only
+the symptoms on the path that decides the goal are ever requested.
+Answers are memoized for the whole query, so one symptom is never asked
+for twice.
+
+    chainer = BackwardChainer()
+    proof = chainer.prove("RAM Failure", ask=lambda symptom: symptom in observed)
+"""
+from collections import namedtuple
+
+from .compiled import compile_rules
+from .core import DiagnosisCancelled
+
+Proof = namedtuple("Proof", ["goal", "proven", "rule", "recommendation", "asked"])
+
+
+class _Query:
+    """Memoized answers and rule outcomes for one call"""
+
+    def __init__(self, ask, answers):
+        self.ask = ask
+        self.answers = answers if answers is not None else {}
+        self.asked = []
+        self.rules = {}  # rule index -> True / False; None while being proven
+
+    def symptom(self, name):
+        if name not in self.answers:
+            self.answers[name] = bool(self.ask(name))
+            self.asked.append(name)
+        return self.answers[name]
+
+
+class BackwardChainer:
+    """Prove or refute one diagnosis at a time, asking only what it needs"""
+
+    def __init__(self, evaluator=None):
+        self.evaluator = evaluator or compile_rules()
+        self.symptoms = self.evaluator.symptoms
+
+        # goal -> [(rule, recommendation)] for every rule concluding it
+        self._concluding = {}
+        for rule in self.evaluator.rules:
+            for content in rule.produces:
+                fact = dict(content)
+                if "diagnosis" in fact:
+                    self._concluding.setdefault(fact["diagnosis"], []).append(
+                        (rule, fact.get("recommendation"))
+                    )
+
+    def goals(self):
+        """Every diagnosis some rule can conclude"""
+        return tuple(self._concluding)
+
+    def prove(self, goal, ask, answers=None):
+        """Return a ``Proof`` for ``goal``; ``ask(symptom)`` answers on demand"""
+        query = _Query(ask, answers)
+        return self._prove_goal(goal, query)
+
+    def prove_all(self, ask, goals=None, cancel=None, progress=None):
+        """Prove several goals, sharing answers; returns the list of proofs
+
+        ``cancel`` (a ``threading.Event``) is checked between goals and
+        ``progress(done, total)`` is called after each one.
+        """
+        goals = goals or self.goals()
+        answers = {}
+        proofs = []
+        for goal in goals:
+            if cancel is not None and cancel.is_set():
+                raise DiagnosisCancelled("diagnosis cancelled")
+            proofs.append(self.prove(goal, ask, answers))
+            if progress is not None:
+                progress(len(proofs), len(goals))
+        return proofs
+
+    def _prove_goal(self, goal, query):
+        for rule, recommendation in self._concluding.get(goal, ()):
+            if self._prove_rule(rule, query):
+                return Proof(goal, True, rule.name, recommendation, tuple(query.asked))
+        return Proof(goal, False, None, None, tuple(query.asked))
+
+    def _prove_rule(self, rule, query):
+        if rule.index in query.rules:
+            # None means the rule is already on the stack: a cycle, not a proof
+            return bool(query.rules[rule.index])
+        query.rules[rule.index] = None
+        proven = any(self._prove_branch(branch, query) for branch in rule.branches)
+        query.rules[rule.index] = proven
+        return proven
+
+    def _literals(self, branch):
+        for kind, value in branch.slots:
+            if kind == "symptom":
+                yield False, self.symptoms[value]
+            elif kind == "derived":
+                yield False, value
+        neg = branch.neg
+        while neg:
+            low = neg & -neg
+            yield True, self.symptoms[low.bit_length() - 1]
+            neg ^= low
+
+    def _prove_branch(self, branch, query):
+        literals = list(self._literals(branch))
+        # Refute from what is already known before asking anything new
+        for negated, value in literals:
+            if isinstance(value, str) and value in query.answers:
+                if query.answers[value] == negated:
+                    return False
+        for negated, value in literals:
+            if isinstance(value, str):
+                if query.symptom(value) == negated:
+                    return False
+            elif not any(self._prove_rule(self.evaluator.rules[p], query) for p in sorted(value)):
+                return False
+        return True
@@ -0,0 +1,211 @@
+"""Bulk diagnosis of JSONL / CSV case files.
+
+Records are streamed from disk in chunks and fanned out to a process
+pool; each worker keeps one warm ``ComputerDiagnosis`` for its whole life.
+Only ``workers * 2`` chunks are in flight at a time, so memory stays flat
+however large the input is.
+
+Input formats:
+
+* JSONL -- one JSON value per line, either a list of symptom names or an
+  object ``{"id": ..., "symptoms": [...]}``.
+* CSV -- with a header row. Either a ``symptoms`` column holding
+  ``;``-separated names (plus an optional ``id`` column), or one column
+  per symptom holding ``1`` / ``true`` / ``yes`` for the present ones.
+
+Usage: ``python -m diagnosis.batch cases.jsonl -o results.jsonl``
+
+Binary symptom matrices (``.npy`` or bit-packed) go through
+``diagnosis.matrix`` instead, which never builds per-record lists.
+Fleets where many machines share a symptom set are cheaper through
+``diagnosis.fleet``, which diagnoses each distinct set once.
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .core import diagnose
+from .pool import EnginePool
+
+DEFAULT_CHUNK_SIZE = 1000
+
+_TRUE = {"1", "true", "yes", "y", "x"}
+
+
+def _open(path):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def read_jsonl(path):
+    """Yield ``(id, symptoms)`` from a JSONL file; ids default to the line number"""
+    with _open(path) as handle:
+        for number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, dict):
+                yield record.get("id", number), list(record.get("symptoms", ()))
+            else:
+                yield number, list(record)
+
+
+def read_csv(path):
+    """Yield ``(id, symptoms)`` from a CSV file; ids default to the row number"""
+    with _open(path) as handle:
+        reader = csv.DictReader(handle)
+        for number, row in enumerate(reader, 1):
+            record_id = row.pop("id", None) or number
+            if "symptoms" in row:
+                symptoms = [s.strip() for s in (row["symptoms"] or "").split(";") if s.strip()]
+            else:
+                symptoms = [name for name, value in row.items()
+                            if value and value.strip().lower() in _TRUE]
+            yield record_id, symptoms
+
+
+def read_records(path, fmt=None):
+    """Pick the reader from ``fmt`` or the file extension"""
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    if fmt == "csv":
+        return read_csv(path)
+    if fmt == "jsonl":
+        return read_jsonl(path)
+    raise ValueError("unknown format %r" % fmt)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Worker side: one warm engine per process
+_worker_pool = None
+
+
+def _init_worker():
+    global _worker_pool
+    _worker_pool = EnginePool(size=1, prebuild=1)
+
+
+def _diagnose_chunk(index, chunk):
+    started = time.perf_counter()
+    results = [(record_id, diagnose(symptoms, pool=_worker_pool)) for record_id, symptoms in chunk]
+    return index, os.getpid(), time.perf_counter() - started, results
+
+
+class BatchStats:
+    """Records and busy time per worker process"""
+
+    def __init__(self):
+        self.workers = {}
+        self.started = time.perf_counter()
+
+    def add(self, pid, records, seconds):
+        entry = self.workers.setdefault(pid, {"records": 0, "seconds": 0.0})
+        entry["records"] += records
+        entry["seconds"] += seconds
+
+    @property
+    def records(self):
+        return sum(entry["records"] for entry in self.workers.values())
+
+    def report(self):
+        """Per-worker and overall throughput in records per second"""
+        elapsed = time.perf_counter() - self.started
+        workers = {
+            pid: dict(entry, records_per_second=entry["records"] / entry["seconds"] if entry["seconds"] else 0.0)
+            for pid, entry in self.workers.items()
+        }
+        return {
+            "records": self.records,
+            "elapsed_seconds": elapsed,
+            "records_per_second": self.records / elapsed if elapsed else 0.0,
+            "workers": workers,
+        }
+
+
+def diagnose_records(records, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, ordered=True, stats=None):
+    """Yield ``(id, DiagnosisResult)`` for every ``(id, symptoms)`` record
+
+    With ``ordered=False`` chunks are yielded as soon as they complete.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+    chunks = enumerate(chunked(records, chunk_size))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        pending = deque()
+
+        def submit_next():
+            item = next(chunks, None)
+            if item is None:
+                return False
+            pending.append(executor.submit(_diagnose_chunk, *item))
+            return True
+
+        while len(pending) < max_pending and submit_next():
+            pass
+
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done = [future for future in pending if future in finished]
+                for future in done:
+                    pending.remove(future)
+
+            for future in done:
+                _, pid, seconds, results = future.result()
+                if stats is not None:
+                    stats.add(pid, len(results), seconds)
+                submit_next()
+                yield from results
+
+
+def diagnose_file(path, out, fmt=None, **options):
+    """Diagnose every record in ``path`` and write JSONL results to ``out``"""
+    stats = options.pop("stats", None) or BatchStats()
+    for record_id, result in diagnose_records(read_records(path, fmt), stats=stats, **options):
+        out.write(json.dumps(dict(id=record_id, **result.as_dict())) + "\n")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk computer fault diagnosis")
+    parser.add_argument("input", help="JSONL or CSV file, '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--format", choices=("jsonl", "csv"))
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--unordered", action="store_true", help="emit results as chunks complete")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        stats = diagnose_file(
+            args.input, out, fmt=args.format, workers=args.workers,
+            chunk_size=args.chunk_size, ordered=not args.unordered,
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps(stats.report(), indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Phase-by-phase benchmarks of the engine lifecycle.
+
+Each knowledge base is timed through the phases a diagnosis goes through:
+``construct`` (instantiating the engine builds the Rete network),
+``reset``, ``declare`` (one ``Fact(symptom=...)`` per symptom), ``run``,
+``scan`` (walking the fact list for diagnosis facts, as the GUI used to)
+and ``result``. Every phase is measured for several symptom sets: none,
+all of them (every rule that can fire does) and random k-subsets.
+
+Besides ``ComputerDiagnosis``, synthetic knowledge bases of 1k and 10k
+rules with the same rule shape show how the phases scale.
+
+    python -m diagnosis.bench --save bench_baseline.json
+    python -m diagnosis.bench --check bench_baseline.json
+    python -m diagnosis.bench --scaling
+
+``--check`` exits non-zero when a phase's median is more than the
+baseline's ``threshold`` times slower (plus ``slack_ms`` of absolute
+tolerance for very short phases). A baseline recorded for other rule
+definitions is refused; one recorded under another Python, experta or
+machine only draws a warning. Re-record the baseline whenever the rules
+change.
+
+``--scaling`` times reset/declare/run from 16 to 10,000 rules with the
+indexed matcher next to experta's own, holding fixed how many rules each
+declared symptom concerns.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import warnings
+
+from experta import DefFacts, Fact, OR, Rule
+from experta.matchers.rete import ReteMatcher
+
+from .catalog import SYMPTOM_NAMES
+from .knowledge import ComputerDiagnosis, DiagnosisEngine, rules_fingerprint
+from .rete import IndexedReteMatcher
+
+BASELINE_VERSION = 1
+DEFAULT_THRESHOLD = 1.25
+DEFAULT_SLACK_MS = 0.05
+
+PHASES = ("construct", "reset", "declare", "run", "scan", "result")
+
+# name -> (rule count or None for ComputerDiagnosis, repeats)
+KNOWLEDGE_BASES = {
+    "computer": (None, 30),
+    "synthetic-1k": (1000, 3),
+    "synthetic-10k": (10000, 1),
+}
+
+SCALING_RULE_COUNTS = (16, 100, 1000, 10000)
+SCALING_PHASES = ("reset", "declare", "run")
+
+
+def synthetic_engine(n_rules, n_symptoms=200, seed=0):
+    """Engine class with ``n_rules`` rules shaped like ``ComputerDiagnosis``'s
+
+    Each rule needs ``action="diagnose"``, one symptom and either of two
+    others, and declares its own diagnosis. Returns ``(engine_cls, symptoms)``.
+    """
+    rng = random.Random(seed)
+    symptoms = tuple("symptom_%d" % number for number in range(n_symptoms))
+
+    def initialize(self):
+        yield Fact(action="diagnose")
+
+    attrs = {"initialize": DefFacts()(initialize)}
+    for number in range(n_rules):
+        first, second, third = rng.sample(symptoms, 3)
+
+        def body(self, _diagnosis="Diagnosis %d" % number):
+            self.declare(Fact(diagnosis=_diagnosis, recommendation="Check %s." % _diagnosis))
+
+        body.__name__ = "rule_%d" % number
+        attrs[body.__name__] = Rule(
+            Fact(action="diagnose"),
+            Fact(symptom=first),
+            OR(Fact(symptom=second), Fact(symptom=third)),
+        )(body)
+    return type("Synthetic%dRules" % n_rules, (DiagnosisEngine,), attrs), symptoms
+
+
+def symptom_sets(symptoms, repeat, seed=0, ks=(3, 8)):
+    """``{name: [symptom list per repeat]}`` for the empty, full and random-k sets"""
+    rng = random.Random(seed)
+    sets = {
+        "empty": [[] for _ in range(repeat)],
+        "all": [list(symptoms) for _ in range(repeat)],
+    }
+    for k in ks:
+        sets["random-%d" % k] = [rng.sample(symptoms, k) for _ in range(repeat)]
+    return sets
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    value = func(*args)
+    return value, (time.perf_counter() - started) * 1000
+
+
+def _declare(engine, symptoms):
+    for symptom in symptoms:
+        engine.declare(Fact(symptom=symptom))
+
+
+def _scan(engine):
+    return [fact for fact in engine.facts.values() if "diagnosis" in fact]
+
+
+def bench_engine(engine_cls, symptoms, repeat):
+    """Time every phase for ``engine_cls``; returns ``{key: [ms, ...]}``"""
+    samples = {}
+    engine = None
+    for _ in range(repeat):
+        engine, elapsed = _timed(engine_cls)
+        samples.setdefault("construct", []).append(elapsed)
+
+    for set_name, cases in symptom_sets(symptoms, repeat).items():
+        for case in cases:
+            for phase, func, args in (
+                ("reset", engine.reset, ()),
+                ("declare", _declare, (engine, case)),
+                ("run", engine.run, ()),
+                ("scan", _scan, (engine,)),
+                ("result", engine.result, ()),
+            ):
+                _, elapsed = _timed(func, *args)
+                samples.setdefault("%s/%s" % (set_name, phase), []).append(elapsed)
+    return samples
+
+
+def _summary(times):
+    return {
+        "median_ms": statistics.median(times),
+        "min_ms": min(times),
+        "max_ms": max(times),
+        "samples": len(times),
+    }
+
+
+def run_benchmarks(kbs=None, repeat_scale=1.0, log=None):
+    """Benchmark each named knowledge base; returns a baseline-shaped dict"""
+    results = {}
+    for name in kbs or KNOWLEDGE_BASES:
+        n_rules, repeat = KNOWLEDGE_BASES[name]
+        repeat = max(1, int(round(repeat * repeat_scale)))
+        if n_rules is None:
+            engine_cls, symptoms = ComputerDiagnosis, SYMPTOM_NAMES
+        else:
+            engine_cls, symptoms = synthetic_engine(n_rules)
+        started = time.perf_counter()
+        for key, times in bench_engine(engine_cls, symptoms, repeat).items():
+            results["%s/%s" % (name, key)] = _summary(times)
+        if log:
+            log("%s: %.1fs" % (name, time.perf_counter() - started))
+
+    import experta
+    return {
+        "version": BASELINE_VERSION,
+        "threshold": DEFAULT_THRESHOLD,
+        "slack_ms": DEFAULT_SLACK_MS,
+        "environment": {
+            "python": platform.python_version(),
+            "experta": getattr(experta, "__version__", None),
+            "machine": platform.machine(),
+            "rules_fingerprint": rules_fingerprint(ComputerDiagnosis),
+        },
+        "results": results,
+    }
+
+
+def bench_scaling(rule_counts=SCALING_RULE_COUNTS, k=8, repeat=5, log=None):
+    """Median reset/declare/run ms per rule count, indexed and plain matcher
+
+    The symptom vocabulary grows with the rules (as many symptoms as
+    rules, three per rule), so each of the ``k`` declared symptoms
+    concerns about three rules whatever the size of the knowledge base.
+    """
+    rows = []
+    for n_rules in rule_counts:
+        engine_cls, symptoms = synthetic_engine(n_rules, n_symptoms=max(8, n_rules))
+        for matcher in (IndexedReteMatcher, ReteMatcher):
+            engine = type(engine_cls.__name__, (engine_cls,), {"__matcher__": matcher})()
+            rng = random.Random(0)
+            times = {phase: [] for phase in SCALING_PHASES}
+            for _ in range(repeat):
+                case = rng.sample(symptoms, k)
+                times["reset"].append(_timed(engine.reset)[1])
+                times["declare"].append(_timed(_declare, engine, case)[1])
+                times["run"].append(_timed(engine.run)[1])
+            row = {"rules": n_rules, "matcher": matcher.__name__}
+            row.update((phase + "_ms", statistics.median(times[phase])) for phase in SCALING_PHASES)
+            rows.append(row)
+            if log:
+                log("%d rules, %s" % (n_rules, matcher.__name__))
+    return rows
+
+
+def format_scaling(rows):
+    lines = ["%8s %-20s %12s %12s %12s" % (("rules", "matcher") + tuple(p + " ms" for p in SCALING_PHASES))]
+    for row in rows:
+        lines.append("%8d %-20s %12.4f %12.4f %12.4f" % (
+            (row["rules"], row["matcher"]) + tuple(row[p + "_ms"] for p in SCALING_PHASES)))
+    return "\n".join(lines)
+
+
+class BaselineMismatch(ValueError):
+    """The baseline was recorded for other rule definitions"""
+
+
+def compare(current, baseline):
+    """Regressions of ``current`` against ``baseline`` as ``(key, base_ms, now_ms)``
+
+    Raises ``BaselineMismatch`` when the two were recorded for different
+    rules and warns when they were recorded in different environments.
+    """
+    now_env, base_env = current.get("environment", {}), baseline.get("environment", {})
+    if now_env.get("rules_fingerprint") != base_env.get("rules_fingerprint"):
+        raise BaselineMismatch("baseline was recorded for other rules (fingerprint %s, now %s)" % (
+            str(base_env.get("rules_fingerprint"))[:12], str(now_env.get("rules_fingerprint"))[:12]))
+    for field in sorted(set(now_env) | set(base_env)):
+        if now_env.get(field) != base_env.get(field):
+            warnings.warn("baseline %s is %r, now %r" % (field, base_env.get(field), now_env.get(field)),
+                          stacklevel=2)
+    threshold = baseline.get("threshold", DEFAULT_THRESHOLD)
+    slack = baseline.get("slack_ms", DEFAULT_SLACK_MS)
+    regressions = []
+    for key, now in sorted(current["results"].items()):
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        limit = base["median_ms"] * base.get("threshold", threshold) + slack
+        if now["median_ms"] > limit:
+            regressions.append((key, base["median_ms"], now["median_ms"]))
+    return regressions
+
+
+def format_table(report):
+    lines = ["%-40s %12s %12s %8s" % ("benchmark", "median ms", "min ms", "n")]
+    for key, row in sorted(report["results"].items()):
+        lines.append("%-40s %12.4f %12.4f %8d" % (key, row["median_ms"], row["min_ms"], row["samples"]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the diagnosis engine lifecycle")
+    parser.add_argument("--kb", action="append", choices=sorted(KNOWLEDGE_BASES),
+                        help="knowledge base to run (repeatable; default: all)")
+    parser.add_argument("--quick", action="store_true", help="skip the 10k-rule knowledge base")
+    parser.add_argument("--repeat-scale", type=float, default=1.0, help="multiply every repeat count")
+    parser.add_argument("--save", metavar="FILE", help="write the results as a baseline")
+    parser.add_argument("--check", metavar="FILE", help="compare against a baseline, exit 1 on regression")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    parser.add_argument("--scaling", action="store_true",
+                        help="time declare/run against the rule count instead")
+    parser.add_argument("--rules", default=",".join(map(str, SCALING_RULE_COUNTS)),
+                        help="comma-separated rule counts for --scaling")
+    args = parser.parse_args(argv)
+    log = lambda line: print(line, file=sys.stderr)  # noqa: E731
+
+    if args.scaling:
+        rows = bench_scaling([int(n) for n in args.rules.split(",")], log=log)
+        print(json.dumps(rows, indent=2) if args.json else format_scaling(rows))
+        return 0
+
+    kbs = args.kb or [name for name in KNOWLEDGE_BASES if not (args.quick and name == "synthetic-10k")]
+    report = run_benchmarks(kbs, args.repeat_scale, log=log)
+    print(json.dumps(report, indent=2) if args.json else format_table(report))
+
+    if args.save:
+        with open(args.save, "w") as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+    if args.check:
+        with open(args.check) as handle:
+            baseline = json.load(handle)
+        try:
+            regressions = compare(report, baseline)
+        except BaselineMismatch as exc:
+            print("%s; re-record it with --save" % exc, file=sys.stderr)
+            return 1
+        for key, base_ms, now_ms in regressions:
+            print("REGRESSION %s: %.4f ms -> %.4f ms (x%.2f)" % (key, base_ms, now_ms, now_ms / base_ms),
+                  file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
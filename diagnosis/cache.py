@@ -0,0 +1,139 @@
+"""Bounded memoization of diagnosis results.
+
+Results are keyed by the canonical symptom set, so ``["a", "b"]`` and
+``["b", "a", "a"]`` share an entry. The engine's result can depend on the
+order in which symptoms are declared, so a miss always runs the engine
+with the symptoms in canonical order: catalog order first, then unknown
+names sorted alphabetically. An integer key is treated as a bitmask over
+``SYMPTOM_NAMES``.
+
+Entries are evicted least-recently-used first and can also expire after
+``ttl`` seconds. The cache remembers ``rules_fingerprint()`` of the engine
+class and drops everything when the rule definitions change. The
+fingerprint is re-checked at most once per ``check_interval`` seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from .catalog import SYMPTOM_NAMES
+from .core import diagnose
+from .knowledge import ComputerDiagnosis, rules_fingerprint
+
+_CATALOG_ORDER = {name: index for index, name in enumerate(SYMPTOM_NAMES)}
+
+
+def canonical_symptoms(symptoms):
+    """Frozen symptom set for a list of names or a catalog bitmask"""
+    if isinstance(symptoms, int):
+        return frozenset(name for bit, name in enumerate(SYMPTOM_NAMES) if symptoms >> bit & 1)
+    return frozenset(symptoms)
+
+
+def canonical_order(symptoms):
+    """Symptoms in catalog order, unknown names sorted after them"""
+    known = len(SYMPTOM_NAMES)
+    return sorted(symptoms, key=lambda name: (_CATALOG_ORDER.get(name, known), name))
+
+
+class ResultCache:
+    """Thread-safe LRU cache of diagnosis results with optional TTL"""
+
+    def __init__(self, maxsize=1024, ttl=None, engine_cls=ComputerDiagnosis,
+                 compute=None, check_interval=1.0, clock=time.monotonic):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.engine_cls = engine_cls
+        self.compute = compute or diagnose
+        self.check_interval = check_interval
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = rules_fingerprint(engine_cls)
+        self._checked_at = clock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _check_rules(self, now):
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        fingerprint = rules_fingerprint(self.engine_cls)
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+
+    def get(self, symptoms, default=None):
+        key = canonical_symptoms(symptoms)
+        with self._lock:
+            now = self.clock()
+            self._check_rules(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expires = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return result
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return default
+
+    def put(self, symptoms, result):
+        key = canonical_symptoms(symptoms)
+        with self._lock:
+            expires = None if self.ttl is None else self.clock() + self.ttl
+            self._entries[key] = (result, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def diagnose(self, symptoms):
+        """Cached equivalent of ``diagnose(canonical_order(symptoms))``"""
+        key = canonical_symptoms(symptoms)
+        result = self.get(key)
+        if result is None:
+            result = self.compute(canonical_order(key))
+            self.put(key, result)
+        return result
+
+    def invalidate(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                size=len(self._entries),
+                maxsize=self.maxsize,
+                hit_rate=self._stats["hits"] / lookups if lookups else 0.0,
+            )
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache():
+    """Process-wide cache used by ``cached_diagnose()``"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ResultCache()
+    return _default_cache
+
+
+def cached_diagnose(symptoms):
+    return default_cache().diagnose(symptoms)
@@ -0,0 +1,11 @@
+"""Symptom catalog shared by the GUI and the headless entry points.
+
+Read from the knowledge base file, so the GUI screens, the cache's bitmask
+keys and the batch readers all use the same list.
+"""
+from .kbfile import default_kb
+
+# (label, symptom) pairs, in the order they are shown to the user
+SYMPTOMS = [tuple(pair) for pair in default_kb().symptoms]
+
+SYMPTOM_NAMES = tuple(name for _, name in SYMPTOMS)
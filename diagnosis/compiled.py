@@ -0,0 +1,441 @@
+"""Bitset compilation of the ``@Rule`` definitions.
+
+Every rule of ``ComputerDiagnosis`` is a boolean formula (AND / OR / NOT)
+over ``Fact(symptom=...)`` patterns, plus patterns on facts declared by
+other rules. ``compile_rules`` reads the rules off the engine class, puts
+each one in disjunctive normal form and turns every branch into a pair of
+bitmasks over a fixed symptom index. Rule bodies are dry-run against a
+recorder to learn which facts they declare.
+
+The scalar path (``CompiledEvaluator.diagnose``) replays experta's depth
+strategy over the matching branches, so it reports the same facts in the
+same order as ``diagnosis.diagnose``. The batch path
+(``CompiledEvaluator.fire_matrix``) scores an (N x symptoms) boolean
+NumPy matrix with vectorized mask tests and never creates a ``Fact``.
+
+``python -m diagnosis.compiled`` checks both paths against experta.
+"""
+import bisect
+import inspect
+import itertools
+from collections import namedtuple
+from functools import lru_cache
+
+from experta import AND, NOT, OR, DefFacts, Fact, P, Rule
+
+from .catalog import SYMPTOM_NAMES
+from .ranges import Range
+from .results import Diagnosis, DiagnosisResult
+from .knowledge import ComputerDiagnosis
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is only needed for batches
+    np = None
+
+# One conjunction of a rule in DNF.  ``pos``/``neg`` are symptom bitmasks,
+# ``derived`` holds one frozenset of producer rule indices per pattern that
+# only other rules can satisfy, ``slots`` keeps every positive pattern in
+# order as ("initial", fact_id) / ("symptom", bit) / ("derived", producers).
+Branch = namedtuple("Branch", ["pos", "neg", "derived", "slots", "initial_fact"])
+
+CompiledRule = namedtuple("CompiledRule", ["index", "name", "salience", "branches", "produces"])
+
+
+class _Recorder:
+    """Stand-in engine that records what a rule body declares"""
+
+    def __init__(self):
+        self.declared = []
+
+    def declare(self, *facts):
+        self.declared.extend(facts)
+
+
+def _content(fact):
+    return frozenset((k, v) for k, v in fact.items() if not Fact.is_special(k))
+
+
+def _matches(pattern, content):
+    return pattern <= content
+
+
+def _reads_numbers(pattern):
+    """True for ``Fact(metric=P(Range(...)))`` patterns on numeric readings"""
+    return any(isinstance(value, P) and isinstance(value.match, Range)
+               for key, value in pattern.items() if not Fact.is_special(key))
+
+
+def _literals(ce):
+    """Expand a conditional element into DNF: a list of [(negated, Fact)]"""
+    if isinstance(ce, Fact):
+        return [[(False, ce)]]
+    if isinstance(ce, NOT):
+        if len(ce) != 1 or not isinstance(ce[0], Fact):
+            raise ValueError("only NOT(Fact(...)) can be compiled: %r" % (ce,))
+        return [[(True, ce[0])]]
+    if isinstance(ce, OR):
+        return [branch for child in ce for branch in _literals(child)]
+    if isinstance(ce, (AND, Rule)):
+        branches = [[]]
+        for child in ce:
+            branches = [a + b for a in branches for b in _literals(child)]
+        return branches
+    raise ValueError("cannot compile conditional element %r" % (ce,))
+
+
+def _class_members(engine_cls, kind):
+    seen = set()
+    for klass in engine_cls.__mro__:
+        for name, obj in vars(klass).items():
+            if isinstance(obj, kind) and name not in seen:
+                seen.add(name)
+                yield name, obj
+
+
+class CompiledEvaluator:
+    """Bitmask evaluator equivalent to running the experta engine"""
+
+    def __init__(self, engine_cls=ComputerDiagnosis, symptoms=SYMPTOM_NAMES):
+        self.engine_cls = engine_cls
+
+        # Facts present after reset(), in fact-id order (InitialFact is id 0)
+        deffacts = sorted(_class_members(engine_cls, DefFacts), key=lambda item: item[1].order)
+        self.initial_facts = []
+        for _, deffact in deffacts:
+            for fact in deffact._wrapped(None):
+                content = _content(fact)
+                if content not in self.initial_facts:
+                    self.initial_facts.append(content)
+
+        rules = sorted(_class_members(engine_cls, Rule), key=lambda item: item[0])
+        produces = []
+        for name, rule in rules:
+            params = list(inspect.signature(rule._wrapped).parameters)[1:]
+            if params:
+                raise ValueError("rule %s binds variables and cannot be compiled" % name)
+            recorder = _Recorder()
+            try:
+                rule._wrapped(recorder)
+            except AttributeError as exc:
+                raise ValueError("rule %s does more than declare facts" % name) from exc
+            produces.append(tuple(_content(fact) for fact in recorder.declared))
+
+        # Symptom index: the catalog first, then symptoms only the rules mention
+        self.symptoms = list(symptoms)
+        for _, rule in rules:
+            for branch in _literals(rule):
+                for _, pattern in branch:
+                    content = _content(pattern)
+                    if len(content) == 1:
+                        (key, value), = content
+                        if key == "symptom" and value not in self.symptoms:
+                            self.symptoms.append(value)
+        self.symptoms = tuple(self.symptoms)
+        self.symptom_index = {name: bit for bit, name in enumerate(self.symptoms)}
+
+        # (key, value) -> indices of the rules declaring a fact with that field
+        produced_by = {}
+        for index, facts in enumerate(produces):
+            for fact in facts:
+                for item in fact:
+                    produced_by.setdefault(item, set()).add(index)
+
+        compiled = []
+        for index, (name, rule) in enumerate(rules):
+            branches = []
+            for literals in _literals(rule):
+                branch = self._compile_branch(name, literals, produces, produced_by)
+                if branch is not None:
+                    branches.append(branch)
+            compiled.append(CompiledRule(index, name, rule.salience, tuple(branches), produces[index]))
+        self.rules = tuple(compiled)
+        # Rules with a branch on numeric readings, which no symptom set satisfies
+        self.reading_rules = frozenset(
+            index for index, (_, rule) in enumerate(rules)
+            if any(not negated and _reads_numbers(pattern)
+                   for literals in _literals(rule) for negated, pattern in literals)
+        )
+
+        # consumers[producer] -> [(rule, branch, slot)] fed by that producer
+        self._consumers = {}
+        for rule in self.rules:
+            for branch in rule.branches:
+                for slot, (kind, value) in enumerate(branch.slots):
+                    if kind == "derived":
+                        for producer in value:
+                            self._consumers.setdefault(producer, []).append((rule, branch, slot))
+
+    def _compile_branch(self, name, literals, produces, produced_by):
+        pos = neg = 0
+        derived = []
+        slots = []
+        for negated, pattern in literals:
+            if _reads_numbers(pattern):
+                # Only declared readings match, never the symptoms compiled here
+                if negated:
+                    continue
+                return None
+            if pattern.has_field_constraints() or pattern.has_nested_accessor():
+                raise ValueError("rule %s uses field constraints" % name)
+            if type(pattern) is not Fact:
+                raise ValueError("rule %s matches on a Fact subclass" % name)
+            content = _content(pattern)
+            bit = None
+            if len(content) == 1:
+                (key, value), = content
+                if key == "symptom":
+                    bit = self.symptom_index[value]
+            initial = [i for i, fact in enumerate(self.initial_facts) if _matches(content, fact)]
+            if content:
+                candidates = set.intersection(*(produced_by.get(item, set()) for item in content))
+            else:
+                candidates = range(len(produces))
+            producers = frozenset(
+                i for i in candidates if any(_matches(content, fact) for fact in produces[i])
+            )
+            if negated:
+                if producers:
+                    raise ValueError("rule %s negates a derived fact" % name)
+                if initial:
+                    return None  # can never match
+                if bit is not None:
+                    neg |= 1 << bit
+                continue
+            if initial:
+                slots.append(("initial", initial[0]))
+            elif bit is not None and not producers:
+                pos |= 1 << bit
+                slots.append(("symptom", bit))
+            elif producers and bit is None:
+                derived.append(producers)
+                slots.append(("derived", producers))
+            elif producers:
+                raise ValueError("rule %s matches a fact both users and rules declare" % name)
+            else:
+                return None  # nothing can ever declare this pattern
+        # experta prepends InitialFact() when a rule starts with NOT or has no pattern
+        initial_fact = not slots or literals[0][0]
+        return Branch(pos, neg, tuple(derived), tuple(slots), initial_fact)
+
+    def encode(self, symptoms):
+        """Bitmask of the known symptoms in ``symptoms``"""
+        mask = 0
+        for symptom in symptoms:
+            bit = self.symptom_index.get(symptom)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def fire(self, symptoms):
+        """Rules in the order experta would fire them, with the facts they add
+
+        Returns ``(firings, facts)``: rule indices in firing order and, in
+        declaration order, ``(content, rule index, firing number)`` for every
+        fact a rule added.
+        """
+        next_id = len(self.initial_facts)
+        ids = {}
+        seen = set()
+        for symptom in symptoms:
+            if symptom in seen:
+                continue
+            seen.add(symptom)
+            bit = self.symptom_index.get(symptom)
+            if bit is not None:
+                ids[bit] = next_id
+            next_id += 1
+        mask = 0
+        for bit in ids:
+            mask |= 1 << bit
+
+        agenda = []
+        counter = itertools.count()
+        derived_ids = {}    # producer rule index -> [fact ids it added]
+        derived_facts = {}  # fact content -> fact id
+
+        def push(rule, branch, fixed_slot=None, fixed_id=None):
+            choices = []
+            for slot, (kind, value) in enumerate(branch.slots):
+                if slot == fixed_slot:
+                    choices.append((fixed_id,))
+                elif kind == "initial":
+                    choices.append((value,))
+                elif kind == "symptom":
+                    choices.append((ids[value],))
+                else:
+                    choices.append(tuple(i for p in value for i in derived_ids.get(p, ())))
+            for combo in itertools.product(*choices):
+                fact_ids = set(combo)
+                if branch.initial_fact:
+                    fact_ids.add(0)
+                key = (rule.salience, sorted(fact_ids, reverse=True))
+                bisect.insort(agenda, (key, next(counter), rule))
+
+        for rule in self.rules:
+            for branch in rule.branches:
+                if mask & branch.pos == branch.pos and not mask & branch.neg:
+                    if all(any(p in derived_ids for p in producers) for producers in branch.derived):
+                        push(rule, branch)
+
+        firings = []
+        facts = []
+        while agenda:
+            _, _, rule = agenda.pop()
+            firings.append(rule.index)
+            for content in rule.produces:
+                if content in derived_facts:
+                    continue
+                derived_facts[content] = next_id
+                derived_ids.setdefault(rule.index, []).append(next_id)
+                facts.append((content, rule.index, len(firings)))
+                for consumer, branch, slot in self._consumers.get(rule.index, ()):
+                    if mask & branch.pos != branch.pos or mask & branch.neg:
+                        continue
+                    others = [producers for i, (kind, producers) in enumerate(branch.slots)
+                              if kind == "derived" and i != slot]
+                    if all(any(p in derived_ids for p in producers) for producers in others):
+                        push(consumer, branch, slot, next_id)
+                next_id += 1
+        return firings, facts
+
+    def diagnose(self, symptoms):
+        """Same result as ``diagnosis.diagnose(symptoms)``"""
+        _, facts = self.fire(symptoms)
+        diagnoses = []
+        for content, rule, order in facts:
+            fact = dict(content)
+            if "diagnosis" in fact:
+                diagnoses.append(Diagnosis(
+                    fact["diagnosis"], fact.get("recommendation"), self.rules[rule].name, order))
+        return DiagnosisResult(diagnoses)
+
+    def fire_matrix(self, matrix, columns=SYMPTOM_NAMES):
+        """Vectorized batch: (N x len(columns)) booleans -> (N x rules) fired"""
+        if np is None:
+            raise ImportError("fire_matrix requires numpy")
+        matrix = np.asarray(matrix, dtype=bool)
+        if matrix.ndim != 2 or matrix.shape[1] != len(columns):
+            raise ValueError("expected an (N x %d) matrix" % len(columns))
+
+        # Pack every row into 64-bit words in this evaluator's symptom order
+        words = np.zeros((matrix.shape[0], self.word_count), dtype=np.uint64)
+        for column, symptom in enumerate(columns):
+            bit = self.symptom_index.get(symptom)
+            if bit is not None:
+                words[:, bit // 64] |= matrix[:, column].astype(np.uint64) << np.uint64(bit % 64)
+        return self.fire_words(words)
+
+    @property
+    def word_count(self):
+        """64-bit words per row in ``fire_words`` input"""
+        return (len(self.symptoms) + 63) // 64
+
+    def _word_masks(self):
+        masks = self.__dict__.get("_masks")
+        if masks is None:
+            def split(mask):
+                return np.array([(mask >> (64 * w)) & 0xFFFFFFFFFFFFFFFF for w in range(self.word_count)],
+                                dtype=np.uint64)
+            masks = self._masks = [[(split(branch.pos), split(branch.neg)) for branch in rule.branches]
+                                   for rule in self.rules]
+        return masks
+
+    def fire_words(self, words):
+        """(N x ``word_count``) uint64 symptom bitmasks -> (N x rules) fired
+
+        Bit ``i`` of a row (word ``i // 64``, bit ``i % 64``) is
+        ``self.symptoms[i]``.
+        """
+        static = []
+        for masks in self._word_masks():
+            static.append([((words & pos) == pos).all(axis=1) & ((words & neg) == 0).all(axis=1)
+                           for pos, neg in masks])
+
+        fired = np.zeros((words.shape[0], len(self.rules)), dtype=bool)
+        changed = True
+        while changed:
+            changed = False
+            for rule in self.rules:
+                column = np.zeros(words.shape[0], dtype=bool)
+                for branch, hit in zip(rule.branches, static[rule.index]):
+                    for producers in branch.derived:
+                        hit = hit & fired[:, sorted(producers)].any(axis=1)
+                    column |= hit
+                if (column & ~fired[:, rule.index]).any():
+                    fired[:, rule.index] |= column
+                    changed = True
+        return fired
+
+    def rule_names(self):
+        return tuple(rule.name for rule in self.rules)
+
+
+@lru_cache(maxsize=None)
+def compile_rules(engine_cls=ComputerDiagnosis):
+    """Compiled evaluator for ``engine_cls``, built once per class"""
+    return CompiledEvaluator(engine_cls)
+
+
+def check_equivalence(evaluator=None, samples=2000, seed=0):
+    """Compare the compiled paths with experta; returns a list of mismatches
+
+    Covers the empty set, every single symptom and pair of symptoms, the
+    whole catalog and ``samples`` random subsets in random order.
+    """
+    import random
+
+    from .core import diagnose
+
+    evaluator = evaluator or compile_rules()
+    rng = random.Random(seed)
+    names = list(evaluator.symptoms)
+    cases = [[], names, names[::-1]]
+    cases += [[name] for name in names]
+    cases += [list(pair) for pair in itertools.combinations(names, 2)]
+    for _ in range(samples):
+        cases.append(rng.sample(names, rng.randint(0, len(names))))
+
+    mismatches = []
+    for case in cases:
+        engine = evaluator.engine_cls()
+        engine.reset()
+        for symptom in case:
+            engine.declare(Fact(symptom=symptom))
+        engine.run()
+        expected_facts = [_content(f) for f in engine.facts.values() if "diagnosis" in f]
+        _, facts = evaluator.fire(case)
+        actual_facts = [content for content, _, _ in facts if dict(content).get("diagnosis")]
+        expected = engine.result()
+        actual = evaluator.diagnose(case)
+        if expected_facts != actual_facts or expected != actual or diagnose(case) != actual:
+            mismatches.append((case, expected, actual))
+
+    if np is not None:
+        matrix = np.array([[name in case for name in names] for case in cases], dtype=bool)
+        fired = evaluator.fire_matrix(matrix, columns=names)
+        for row, case in zip(fired, cases):
+            firings, _ = evaluator.fire(case)
+            if set(np.flatnonzero(row)) != set(firings):
+                mismatches.append((case, sorted(set(firings)), list(np.flatnonzero(row))))
+    return mismatches
+
+
+if __name__ == "__main__":
+    import sys
+    import timeit
+
+    evaluator = compile_rules()
+    mismatches = check_equivalence(evaluator)
+    for case, expected, actual in mismatches[:20]:
+        print("MISMATCH", case, expected, actual)
+    case = ["random_crashes", "blue_screen", "high_cpu_temperature"]
+    number = 20000
+    per_call = timeit.timeit(lambda: evaluator.diagnose(case), number=number) / number
+    print("%d mismatches; scalar diagnose %.1f us" % (len(mismatches), per_call * 1e6))
+    if np is not None:
+        rng = np.random.default_rng(0)
+        matrix = rng.random((1_000_000, len(SYMPTOM_NAMES))) < 0.1
+        seconds = timeit.timeit(lambda: evaluator.fire_matrix(matrix), number=1)
+        print("fire_matrix: %.0f rows/s" % (len(matrix) / seconds))
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,52 @@
+"""Headless diagnosis entry point."""
+from time import perf_counter
+
+from experta import Fact
+
+from .pool import default_pool
+
+
+class DiagnosisCancelled(Exception):
+    """The ``cancel`` event was set before the diagnosis finished"""
+
+
+def diagnose(symptoms, pool=None, cancel=None, progress=None, readings=None, limit=None, budget=None):
+    """Run the knowledge engine over the given symptom names
+
+    ``readings`` maps metric names to numbers, each declared as its own
+    fact (``{"cpu_temp": 92}`` becomes ``Fact(cpu_temp=92)``) for the
+    rules with range conditions.
+
+    ``cancel`` is an optional ``threading.Event`` checked between
+    declarations and rule firings; ``progress(fired, rule_name)`` is
+    called after each firing. Both are meant for callers running the
+    diagnosis off their main thread.
+
+    ``limit=1`` returns the first (highest salience) match only and
+    ``limit=k`` the top k; ``budget`` caps the call at that many seconds,
+    declarations included. The result is then ``truncated`` when rules
+    were left unfired.
+    """
+    started = perf_counter()
+    pool = pool or default_pool()
+    facts = [Fact(symptom=symptom) for symptom in symptoms]
+    if readings:
+        facts.extend(Fact(**{metric: value}) for metric, value in readings.items())
+    with pool.engine() as engine:
+        engine.cancel, engine.on_fire = cancel, progress
+        try:
+            for fact in facts:
+                if cancel is not None and cancel.is_set():
+                    break
+                engine.declare(fact)
+            else:
+                engine.run(limit=limit,
+                           budget=None if budget is None else max(0.0, budget - (perf_counter() - started)))
+        finally:
+            engine.cancel = engine.on_fire = None
+        result = engine.result()
+
+    # Raised outside the pool checkout so the engine is kept, not rebuilt
+    if cancel is not None and cancel.is_set():
+        raise DiagnosisCancelled("diagnosis cancelled")
+    return result
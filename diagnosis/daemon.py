@@ -0,0 +1,252 @@
+"""Long-lived local diagnosis daemon on a Unix domain socket.
+
+The ``diagnose`` script at the top of the repository is its client. It only
+imports the standard library and starts the daemon on first use, so each
+invocation costs an interpreter start and a socket round trip instead of
+importing experta and building the Rete network.
+
+Protocol: newline-delimited JSON, one reply line per request line, in
+order. A request is a list of symptom names, an object
+``{"id": ..., "symptoms": [...]}`` or a command ``{"cmd": "ping" | "stats" |
+"stop"}``. A diagnosis reply is ``DiagnosisResult.as_dict()`` (plus ``id``
+when given); a bad request gets ``{"error": "..."}`` and the connection
+stays open.
+
+Engines stay warm in an ``EnginePool`` and results are memoized in a
+``ResultCache``, so repeated symptom sets never reach an engine. With
+``--snapshot`` the engines are restored from a snapshot file instead of
+being built (see ``diagnosis.snapshot``). The socket is created user-only
+(mode 0600). Without ``$DIAGNOSIS_SOCKET`` or ``$XDG_RUNTIME_DIR`` it goes
+in a per-user 0700 directory under the temp directory, which the daemon
+refuses to use when another user owns it or can enter it. Neither the
+daemon nor the client touches a path that is not a socket owned by the
+current user.
+
+    python -m diagnosis.daemon [--socket PATH] [--workers N] [--snapshot FILE]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import stat
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import ResultCache, canonical_order, canonical_symptoms
+from .core import diagnose
+from .pool import EnginePool
+from .snapshot import snapshot_factory
+
+MAX_LINE_BYTES = 1 << 20
+DEFAULT_CACHE_SIZE = 4096
+
+
+def default_socket_path():
+    """``$DIAGNOSIS_SOCKET``, else a per-user socket in the runtime directory
+
+    The ``diagnose`` client computes the same path without importing this module.
+    """
+    configured = os.environ.get("DIAGNOSIS_SOCKET")
+    if configured:
+        return configured
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "diagnosis.sock")
+    return os.path.join(private_socket_dir(), "diagnosis.sock")
+
+
+def private_socket_dir():
+    """Per-user directory for the socket when no runtime directory is set"""
+    # tempfile.gettempdir()'s lookup, which the client repeats without importing tempfile
+    temp = next((os.environ[name] for name in ("TMPDIR", "TEMP", "TMP") if os.environ.get(name)), "/tmp")
+    return os.path.join(os.path.abspath(temp), "diagnosis-%d" % os.getuid())
+
+
+def check_socket_owner(path):
+    """Raise ``PermissionError`` unless ``path`` is a socket of the current user
+
+    Returns False when nothing exists at ``path``.
+    """
+    try:
+        info = os.lstat(path)
+    except FileNotFoundError:
+        return False
+    if not stat.S_ISSOCK(info.st_mode):
+        raise PermissionError("%s exists and is not a socket" % path)
+    if info.st_uid != os.getuid():
+        raise PermissionError("%s belongs to uid %d, not to this user" % (path, info.st_uid))
+    return True
+
+
+def private_directory(path):
+    """Create ``path`` as a 0700 directory, or check that it already is one of ours"""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError("%s is not a directory only this user can access" % path)
+
+
+def _symptoms(value):
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError("symptoms must be a list of strings")
+    return value
+
+
+class DiagnosisDaemon:
+    """asyncio Unix socket server over a warm engine pool and result cache"""
+
+    def __init__(self, path=None, workers=4, cache_size=DEFAULT_CACHE_SIZE, snapshot=None):
+        self.path = path or default_socket_path()
+        if snapshot is None:
+            self.pool = EnginePool(size=workers, prebuild=1)
+        else:
+            self.pool = EnginePool(snapshot_factory(snapshot), size=workers, prebuild=1)
+        self.cache = ResultCache(maxsize=cache_size, compute=lambda symptoms: diagnose(symptoms, pool=self.pool))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="diagnose")
+        self.started = time.time()
+        self.requests = 0
+        self.connections = 0
+        self.server = None
+
+    async def handle_request(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"error": "request is not valid JSON"}
+        if isinstance(request, dict) and "cmd" in request:
+            return self.command(request["cmd"])
+
+        try:
+            if isinstance(request, dict):
+                case_id, symptoms = request.get("id"), _symptoms(request.get("symptoms"))
+            else:
+                case_id, symptoms = None, _symptoms(request)
+        except ValueError as exc:
+            return {"error": str(exc)}
+
+        self.requests += 1
+        # Cache hits are answered on the loop; only misses go to an engine thread
+        result = self.cache.get(symptoms)
+        if result is None:
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, self._diagnose, symptoms)
+        reply = result.as_dict()
+        if case_id is not None:
+            reply["id"] = case_id
+        return reply
+
+    def _diagnose(self, symptoms):
+        key = canonical_symptoms(symptoms)
+        result = self.cache.compute(canonical_order(key))
+        self.cache.put(key, result)
+        return result
+
+    def command(self, name):
+        if name == "ping":
+            return {"pong": True}
+        if name == "stats":
+            return {
+                "pid": os.getpid(),
+                "uptime_seconds": time.time() - self.started,
+                "requests": self.requests,
+                "connections": self.connections,
+                "cache": self.cache.stats(),
+                "pool": self.pool.metrics(),
+            }
+        if name == "stop":
+            asyncio.get_running_loop().call_soon(self.server.close)
+            return {"stopping": True}
+        return {"error": "unknown command %r" % (name,)}
+
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(b'{"error": "request line too long"}\n')
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                reply = await self.handle_request(line)
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _claim_path(self):
+        """Remove a stale socket file; refuse to replace a live daemon"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if directory == private_socket_dir():
+            private_directory(directory)
+        if not check_socket_owner(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path)
+        else:
+            raise RuntimeError("a diagnosis daemon is already listening on %s" % self.path)
+        finally:
+            probe.close()
+
+    async def start(self):
+        self._claim_path()
+        umask = os.umask(0o177)
+        try:
+            self.server = await asyncio.start_unix_server(self.handle_connection, self.path, limit=MAX_LINE_BYTES)
+        finally:
+            os.umask(umask)
+        return self.server
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass  # closed by a "stop" command
+        finally:
+            self.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local diagnosis daemon on a Unix socket")
+    parser.add_argument("--socket", default=None, help="socket path (default: %s)" % default_socket_path())
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE)
+    parser.add_argument("--snapshot", default=None, help="restore engines from this snapshot file (written if stale)")
+    args = parser.parse_args(argv)
+
+    daemon = DiagnosisDaemon(args.socket, args.workers, args.cache_size, args.snapshot)
+    try:
+        asyncio.run(daemon.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    except (RuntimeError, PermissionError) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Fleet reports that diagnose each distinct symptom set once.
+
+A fleet of hundreds of thousands of machines reports far fewer distinct
+symptom combinations than it has machines. ``FleetReport`` groups machine
+ids by their canonical symptom set (see ``diagnosis.cache``), runs the
+engine once per group, in canonical order like ``ResultCache``, and
+fans each result back out to the group's machines. The aggregates are
+built in that same pass over the groups:
+
+* ``diagnoses`` -- machines per diagnosis, most frequent first; a machine
+  with several diagnoses counts once for each;
+* ``patterns`` -- the most common combinations of two or more symptoms,
+  with the machines reporting them and their diagnoses;
+* ``recommendations`` -- the ids of the machines each recommendation
+  applies to.
+
+Input is any file ``diagnosis.batch`` reads (JSONL or CSV). ``--results``
+also writes one JSONL result per machine, grouped by symptom set.
+
+    python -m diagnosis.fleet machines.jsonl [--top N] [--workers N] [--results OUT.jsonl]
+"""
+import argparse
+import heapq
+import json
+import sys
+import time
+from collections import Counter
+
+from .batch import diagnose_records, read_records
+from .cache import canonical_order, canonical_symptoms
+from .core import diagnose
+
+DEFAULT_TOP = 10
+
+
+class FleetReport:
+    """Machine ids grouped by symptom set, diagnosed one group at a time"""
+
+    def __init__(self):
+        self.groups = {}  # canonical symptom set -> machine ids
+        self.machines = 0
+
+    def add(self, machine_id, symptoms):
+        key = canonical_symptoms(symptoms)
+        ids = self.groups.get(key)
+        if ids is None:
+            ids = self.groups[key] = []
+        ids.append(machine_id)
+        self.machines += 1
+
+    def add_records(self, records):
+        """Group every ``(id, symptoms)`` record, as the batch readers yield them"""
+        for machine_id, symptoms in records:
+            self.add(machine_id, symptoms)
+        return self
+
+    def diagnose(self, workers=1, pool=None):
+        """Yield ``(symptom set, machine ids, DiagnosisResult)`` once per group
+
+        With ``workers > 1`` the groups go to ``batch.diagnose_records``'
+        process pool and come back in completion order.
+        """
+        keys = list(self.groups)
+        cases = ((index, canonical_order(key)) for index, key in enumerate(keys))
+        if workers > 1:
+            results = diagnose_records(cases, workers=workers, ordered=False)
+        else:
+            results = ((index, diagnose(symptoms, pool=pool)) for index, symptoms in cases)
+        for index, result in results:
+            key = keys[index]
+            yield key, self.groups[key], result
+
+    def report(self, workers=1, top=DEFAULT_TOP, pool=None, on_result=None):
+        """Aggregate the fleet; ``on_result(symptoms, ids, result)`` sees each group"""
+        started = time.perf_counter()
+        histogram = Counter()
+        recommendations = {}
+        patterns = []
+        undiagnosed = 0
+
+        for key, ids, result in self.diagnose(workers, pool):
+            if on_result is not None:
+                on_result(key, ids, result)
+            count = len(ids)
+            if not result:
+                undiagnosed += count
+            names = list(dict.fromkeys(entry.diagnosis for entry in result))
+            for name in names:
+                histogram[name] += count
+            for recommendation in dict.fromkeys(entry.recommendation for entry in result):
+                if recommendation is not None:
+                    recommendations.setdefault(recommendation, []).extend(ids)
+            if len(key) > 1:
+                patterns.append((count, key, names))
+
+        elapsed = time.perf_counter() - started
+        # Ties broken by symptoms, so the order is the same whichever group finished first
+        common = heapq.nsmallest(top, patterns, key=lambda pattern: (-pattern[0], canonical_order(pattern[1])))
+        return {
+            "machines": self.machines,
+            "symptom_sets": len(self.groups),
+            "elapsed_seconds": elapsed,
+            "diagnoses": dict(histogram.most_common()),
+            "undiagnosed": undiagnosed,
+            "patterns": [
+                {"symptoms": canonical_order(key), "machines": count, "diagnoses": names}
+                for count, key, names in common
+            ],
+            "recommendations": dict(sorted(recommendations.items(), key=lambda item: -len(item[1]))),
+        }
+
+
+def fleet_report(records, workers=1, top=DEFAULT_TOP, pool=None, on_result=None):
+    """Report over ``(id, symptoms)`` records; see ``FleetReport.report``"""
+    return FleetReport().add_records(records).report(workers, top, pool, on_result)
+
+
+def _result_writer(out):
+    def write(key, ids, result):
+        # Encoded once per group, then repeated for each of its machines
+        body = json.dumps(result.as_dict())[1:]
+        out.writelines('{"id": %s, %s\n' % (json.dumps(machine_id), body) for machine_id in ids)
+    return write
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fleet diagnosis report over distinct symptom sets")
+    parser.add_argument("input", help="JSONL or CSV file, '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSON report file (default: stdout)")
+    parser.add_argument("--format", choices=("jsonl", "csv"))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="symptom patterns to list")
+    parser.add_argument("--results", default=None, help="also write per-machine JSONL results here")
+    args = parser.parse_args(argv)
+
+    results = open(args.results, "w", encoding="utf-8") if args.results else None
+    try:
+        report = fleet_report(read_records(args.input, args.format), args.workers, args.top,
+                              on_result=_result_writer(results) if results else None)
+    finally:
+        if results is not None:
+            results.close()
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        json.dump(report, out, indent=2)
+        out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""Declarative knowledge base files.
+
+A knowledge base is a JSON (or, with PyYAML installed, YAML) document:
+
+    {
+      "name": "ComputerDiagnosis",
+      "context": {"action": "diagnose"},
+      "symptoms": [{"name": "no_fan", "label": "No fan"}, ...],
+      "rules": [
+        {"name": "ram_failure",
+         "when": ["random_crashes", {"any": ["blue_screen", "beeps"]}],
+         "diagnosis": "RAM Failure",
+         "recommendation": "Reseat or replace RAM."}
+      ]
+    }
+
+``context`` is declared on ``reset()`` and required by every rule, the
+way ``Fact(action="diagnose")`` is. A condition is a symptom name, a fact
+pattern (``{"fact": {...}}``, or ``{"diagnosis": "..."}`` for a fact some
+rule declares), a numeric range on a reading
+(``{"reading": {"cpu_temp": {">=": 90, "<": 100}}}``, matched against
+facts such as ``Fact(cpu_temp=92)``), or ``{"all": [...]}``,
+``{"any": [...]}`` and ``{"not": condition}``. The ``when`` list is a
+conjunction. ``salience`` is optional (default 0); higher salience fires
+first, so ``computer.json`` ranks rules requiring several symptoms (20)
+and one symptom plus alternatives (10) above single-``any`` catch-alls.
+
+``build_engine`` turns a parsed file into a ``DiagnosisEngine`` subclass
+with one ``@Rule`` per entry, so experta compiles it into the same Rete
+network a hand-written class gets. Parsed and validated files are
+pickled into a cache directory under the SHA-256 of their bytes, so the
+next process skips parsing and validation; set ``DIAGNOSIS_CACHE_DIR`` to
+move the cache or to an empty string to disable it.
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import tempfile
+from collections import namedtuple
+from functools import lru_cache
+
+from experta import AND, NOT, OR, DefFacts, Fact, P, Rule
+
+from .ranges import Range
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover - YAML knowledge bases are optional
+    yaml = None
+
+# Bump whenever the normalized form below changes, to orphan stale cache entries
+FORMAT_VERSION = 2
+
+DEFAULT_KB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kb", "computer.json")
+
+# ``when`` is a tuple of normalized conditions: ("fact", ((key, value), ...)),
+# ("range", (metric, Range)), ("all", (...)), ("any", (...)) or
+# ("not", condition). ``declares`` holds
+# the facts the rule asserts, as tuples of (key, value) pairs.
+RuleSpec = namedtuple("RuleSpec", ["name", "salience", "when", "declares"])
+
+KnowledgeBase = namedtuple("KnowledgeBase", ["name", "context", "symptoms", "rules", "digest"])
+
+
+class KnowledgeBaseError(ValueError):
+    """The knowledge base file is malformed"""
+
+
+def name_key(name):
+    """Spelling-insensitive form of a symptom or diagnosis name
+
+    ``"Power_Supply_Failure"``, ``"Power Supply Failure"`` and
+    ``"power_supply_failure"`` all have the same key.
+    """
+    return re.sub(r"[^0-9a-z]", "", str(name).lower())
+
+
+def _cache_dir():
+    configured = os.environ.get("DIAGNOSIS_CACHE_DIR")
+    if configured is not None:
+        return configured or None
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "diagnosis-kb")
+
+
+def _condition(value, where):
+    if isinstance(value, str):
+        return ("fact", (("symptom", value),))
+    if not isinstance(value, dict) or len(value) != 1:
+        raise KnowledgeBaseError("%s: expected a symptom name or a one-key object, got %r" % (where, value))
+    (kind, arg), = value.items()
+    if kind in ("all", "any"):
+        if not isinstance(arg, list) or not arg:
+            raise KnowledgeBaseError("%s: %r needs a non-empty list" % (where, kind))
+        return (kind, tuple(_condition(item, where) for item in arg))
+    if kind == "not":
+        inner = _condition(arg, where)
+        if inner[0] not in ("fact", "range"):
+            raise KnowledgeBaseError("%s: only a single fact or reading can be negated" % where)
+        return ("not", inner)
+    if kind == "fact":
+        return ("fact", _items(arg, where))
+    if kind == "reading":
+        return _reading(arg, where)
+    if kind == "diagnosis":
+        return ("fact", (("diagnosis", arg),))
+    raise KnowledgeBaseError("%s: unknown condition %r" % (where, kind))
+
+
+def _reading(mapping, where):
+    if not isinstance(mapping, dict) or len(mapping) != 1:
+        raise KnowledgeBaseError("%s: a reading condition names exactly one metric" % where)
+    (metric, bounds), = mapping.items()
+    if not isinstance(metric, str) or not metric.isidentifier() or "__" in metric:
+        raise KnowledgeBaseError("%s: invalid metric name %r" % (where, metric))
+    if not isinstance(bounds, dict) or not bounds:
+        raise KnowledgeBaseError("%s: reading %r needs comparisons such as {\">=\": 90}" % (where, metric))
+    for op, limit in bounds.items():
+        if isinstance(limit, bool) or not isinstance(limit, (int, float)):
+            raise KnowledgeBaseError("%s: reading %r: %r needs a number" % (where, metric, op))
+    try:
+        return ("range", (metric, Range.from_ops(bounds)))
+    except ValueError as exc:
+        raise KnowledgeBaseError("%s: reading %r: %s" % (where, metric, exc)) from None
+
+
+def _items(mapping, where):
+    if not isinstance(mapping, dict) or not mapping:
+        raise KnowledgeBaseError("%s: expected a non-empty object of fact fields" % where)
+    for key, value in mapping.items():
+        if not isinstance(key, str) or "__" in key:
+            raise KnowledgeBaseError("%s: invalid fact field %r" % (where, key))
+        if not isinstance(value, (str, int, float, bool)):
+            raise KnowledgeBaseError("%s: fact field %r must be a scalar" % (where, key))
+    return tuple(mapping.items())
+
+
+def normalize(document, digest=None):
+    """Validate a parsed document and return a ``KnowledgeBase``"""
+    if not isinstance(document, dict):
+        raise KnowledgeBaseError("a knowledge base must be an object")
+    name = document.get("name", "KnowledgeBase")
+    if not isinstance(name, str) or not name.isidentifier():
+        raise KnowledgeBaseError("name must be a Python identifier, got %r" % (name,))
+    context = _items(document["context"], "context") if document.get("context") else ()
+
+    symptoms = []
+    seen = set()
+    for number, entry in enumerate(document.get("symptoms", ())):
+        if isinstance(entry, str):
+            entry = {"name": entry}
+        symptom = entry.get("name") if isinstance(entry, dict) else None
+        if not isinstance(symptom, str) or not symptom:
+            raise KnowledgeBaseError("symptoms[%d]: missing name" % number)
+        if symptom in seen:
+            raise KnowledgeBaseError("symptoms[%d]: duplicate symptom %r" % (number, symptom))
+        seen.add(symptom)
+        symptoms.append((entry.get("label", symptom), symptom))
+
+    rules = []
+    names = set()
+    for number, entry in enumerate(document.get("rules", ())):
+        where = "rules[%d]" % number
+        if not isinstance(entry, dict):
+            raise KnowledgeBaseError("%s: expected an object" % where)
+        rule_name = entry.get("name")
+        if not isinstance(rule_name, str) or not rule_name.isidentifier() or rule_name.startswith("_"):
+            raise KnowledgeBaseError("%s: name must be a public identifier, got %r" % (where, rule_name))
+        if rule_name in names:
+            raise KnowledgeBaseError("%s: duplicate rule %r" % (where, rule_name))
+        names.add(rule_name)
+        where = "rule %s" % rule_name
+
+        when = entry.get("when")
+        if not isinstance(when, list) or not when:
+            raise KnowledgeBaseError("%s: 'when' must be a non-empty list" % where)
+        salience = entry.get("salience", 0)
+        if not isinstance(salience, int) or isinstance(salience, bool):
+            raise KnowledgeBaseError("%s: salience must be an integer" % where)
+
+        declares = []
+        if "diagnosis" in entry:
+            conclusion = {"diagnosis": entry["diagnosis"]}
+            if "recommendation" in entry:
+                conclusion["recommendation"] = entry["recommendation"]
+            declares.append(_items(conclusion, where))
+        for fact in entry.get("declare", ()):
+            declares.append(_items(fact, where))
+        if not declares:
+            raise KnowledgeBaseError("%s: declares nothing" % where)
+
+        rules.append(RuleSpec(
+            rule_name, salience, tuple(_condition(item, where) for item in when), tuple(declares)))
+
+    return KnowledgeBase(name, context, tuple(symptoms), tuple(rules), digest)
+
+
+def parse(data, fmt="json"):
+    """Parse raw file bytes (``fmt`` is ``"json"`` or ``"yaml"``)"""
+    if fmt == "yaml":
+        if yaml is None:
+            raise ImportError("PyYAML is required to load YAML knowledge bases")
+        document = yaml.safe_load(data)
+    else:
+        document = json.loads(data)
+    return normalize(document, hashlib.sha256(data).hexdigest())
+
+
+def _format(path):
+    return "yaml" if path.lower().endswith((".yaml", ".yml")) else "json"
+
+
+def load_kb(path=DEFAULT_KB_PATH, cache_dir=None):
+    """Load a knowledge base file, going through the on-disk cache"""
+    with open(path, "rb") as handle:
+        data = handle.read()
+    digest = hashlib.sha256(data).hexdigest()
+    cache_dir = _cache_dir() if cache_dir is None else cache_dir
+    cache_file = os.path.join(cache_dir, "%s-v%d.pickle" % (digest, FORMAT_VERSION)) if cache_dir else None
+
+    if cache_file:
+        try:
+            with open(cache_file, "rb") as handle:
+                kb = pickle.load(handle)
+            if isinstance(kb, KnowledgeBase) and kb.digest == digest:
+                return kb
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            pass
+
+    kb = parse(data, _format(path))
+    if cache_file:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as handle:
+                pickle.dump(kb, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache_file)
+        except OSError:
+            pass  # a read-only cache only costs the parse next time
+    return kb
+
+
+@lru_cache(maxsize=None)
+def default_kb():
+    """The computer diagnosis knowledge base shipped with the package"""
+    return load_kb(DEFAULT_KB_PATH)
+
+
+def _pattern(condition):
+    kind, arg = condition
+    if kind == "fact":
+        return Fact(**dict(arg))
+    if kind == "range":
+        metric, bounds = arg
+        return Fact(**{metric: P(bounds)})
+    if kind == "not":
+        return NOT(_pattern(arg))
+    return (AND if kind == "all" else OR)(*(_pattern(item) for item in arg))
+
+
+def _declaring(facts):
+    def body(self):
+        for fact in facts:
+            self.declare(Fact(**dict(fact)))
+    return body
+
+
+def build_engine(kb, base, module=None):
+    """``base`` subclass named ``kb.name`` with one ``@Rule`` per rule spec"""
+    attrs = {"__module__": module or __name__, "knowledge_base": kb}
+    if kb.context:
+        def initialize(self):
+            yield Fact(**dict(kb.context))
+        attrs["initialize"] = DefFacts()(initialize)
+
+    for spec in kb.rules:
+        patterns = [_pattern(condition) for condition in spec.when]
+        if kb.context:
+            patterns.insert(0, Fact(**dict(kb.context)))
+        body = _declaring(spec.declares)
+        body.__name__ = body.__qualname__ = spec.name
+        attrs[spec.name] = Rule(*patterns, salience=spec.salience)(body)
+    return type(kb.name, (base,), attrs)
@@ -0,0 +1,176 @@
+"""Knowledge base: the ``ComputerDiagnosis`` rule engine."""
+import hashlib
+from time import perf_counter
+
+from experta import DefFacts, KnowledgeEngine, Rule, watchers
+
+from .kbfile import build_engine, default_kb
+from .rete import IndexedReteMatcher
+from .results import Diagnosis, DiagnosisResult
+
+
+class DiagnosisEngine(KnowledgeEngine):
+    """KnowledgeEngine that indexes diagnosis facts as they are declared
+
+    Every newly declared ``Fact(diagnosis=...)`` is appended to
+    ``self.diagnoses`` together with the rule being fired and its firing
+    number, so ``result()`` never has to scan the fact list.
+
+    Set ``profiler`` to a ``diagnosis.profiling.RuleProfiler`` to record
+    per-rule and per-run statistics. ``run()`` stops before the next
+    firing once ``cancel`` (a ``threading.Event``) is set, and calls
+    ``on_fire(fired, rule_name)`` after each firing. ``run(limit=1)``,
+    ``run(limit=k)`` and ``run(budget=seconds)`` stop early; ``truncated``
+    then records that activations were left unfired. Matching goes through
+    ``IndexedReteMatcher``, so a declaration only reaches the rules that
+    mention its values.
+    """
+
+    __matcher__ = IndexedReteMatcher
+
+    profiler = None
+    cancel = None
+    on_fire = None
+
+    def __init__(self):
+        super().__init__()
+        self.diagnoses = []
+        self.fired = 0
+        self.truncated = False
+        self._firing = None
+        self._match_seconds = 0.0
+
+    def reset(self, **kwargs):
+        super().reset(**kwargs)
+        self.diagnoses = []
+        self.fired = 0
+        self.truncated = False
+        self._firing = None
+        self._match_seconds = 0.0
+
+    def get_activations(self):
+        if self.profiler is None:
+            return super().get_activations()
+        started = perf_counter()
+        added, removed = super().get_activations()
+        self._match_seconds += perf_counter() - started
+        self.profiler.record_activations(added)
+        return added, removed
+
+    def declare(self, *facts):
+        last_inserted = None
+        for fact in facts:
+            inserted = super().declare(fact)
+            if inserted is None:
+                continue
+            last_inserted = inserted
+            if "diagnosis" in inserted:
+                self.diagnoses.append(Diagnosis(
+                    inserted["diagnosis"],
+                    inserted.get("recommendation"),
+                    self._firing,
+                    self.fired if self._firing else 0,
+                ))
+        return last_inserted
+
+    def run(self, steps=float("inf"), limit=None, budget=None):
+        """Execute agenda activations (same loop as experta's)
+
+        ``limit`` stops firing once that many diagnoses have been declared
+        (1 for the first match, k for the top k) and ``budget`` once that
+        many seconds have passed. The agenda fires higher salience first,
+        so an early stop keeps the most specific diagnoses.
+        """
+        profiler = self.profiler
+        depth = 0
+        deadline = None if budget is None else perf_counter() + budget
+        self.truncated = False
+        self.running = True
+        while self.running:
+            if self.cancel is not None and self.cancel.is_set():
+                break
+            added, removed = self.get_activations()
+            self.strategy.update_agenda(self.agenda, added, removed)
+            if profiler is not None:
+                depth = max(depth, len(self.agenda.activations))
+
+            if not self.agenda.activations:
+                break
+            if steps <= 0 or (limit is not None and len(self.diagnoses) >= limit) or (
+                    deadline is not None and perf_counter() >= deadline):
+                self.truncated = True
+                break
+            activation = self.agenda.get_next()
+
+            steps -= 1
+            self.fired += 1
+            self._firing = activation.rule.__name__
+            if watchers.worth("RULES", "INFO"):  # pragma: no cover
+                watchers.RULES.info(
+                    "FIRE %s %s: %s", self.fired, self._firing,
+                    ", ".join(str(f) for f in activation.facts))
+            started = perf_counter() if profiler is not None else None
+            try:
+                activation.rule(
+                    self,
+                    **{k: v for k, v in activation.context.items() if not k.startswith("__")})
+            finally:
+                self._firing = None
+                if started is not None:
+                    profiler.record_fire(activation.rule.__name__, perf_counter() - started)
+            if self.on_fire is not None:
+                self.on_fire(self.fired, activation.rule.__name__)
+
+        self.running = False
+        if profiler is not None:
+            profiler.record_run(self._match_seconds, depth, len(self.facts))
+            self._match_seconds = 0.0
+
+    def result(self):
+        """Ranked, immutable result of the last run"""
+        return DiagnosisResult(self.diagnoses, self.truncated)
+
+# The rules, symptoms and recommendations live in kb/computer.json
+ComputerDiagnosis = build_engine(default_kb(), DiagnosisEngine, module=__name__)
+
+
+def _code_fingerprint(code):
+    parts = [code.co_code, repr(code.co_names).encode()]
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            parts.append(_code_fingerprint(const))
+        else:
+            parts.append(repr(const).encode())
+    return b"\0".join(parts)
+
+
+def _function_fingerprint(func):
+    # Rules built from a knowledge base file share one body and differ
+    # only in the facts captured by its closure
+    parts = [_code_fingerprint(func.__code__)]
+    for cell in func.__closure__ or ():
+        parts.append(repr(cell.cell_contents).encode())
+    return b"\0".join(parts)
+
+
+def rules_fingerprint(engine_cls=ComputerDiagnosis):
+    """SHA-256 over every @Rule / @DefFacts definition of ``engine_cls``
+
+    Covers the LHS patterns, salience and the compiled RHS body, so it
+    changes whenever the knowledge base does.
+    """
+    digest = hashlib.sha256()
+    seen = set()
+    for klass in engine_cls.__mro__:
+        for name, obj in sorted(vars(klass).items()):
+            if name in seen or not isinstance(obj, (Rule, DefFacts)):
+                continue
+            seen.add(name)
+            digest.update(name.encode())
+            if isinstance(obj, Rule):
+                digest.update(repr(tuple(obj)).encode())
+                digest.update(repr(obj.salience).encode())
+            else:
+                digest.update(repr(obj.order).encode())
+            digest.update(_function_fingerprint(obj._wrapped))
+    return digest.hexdigest()
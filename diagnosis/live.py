@@ -0,0 +1,71 @@
+"""Incremental diagnosis session for interactive symptom toggling.
+
+A ``LiveSession`` keeps one engine reset for its whole life. Toggling a
+symptom declares or retracts exactly that one ``Fact(symptom=...)``, and
+the Rete network only propagates that change. The agenda then lists the
+rules whose conditions hold right now. The session never runs the
+agenda, because fired rule bodies would leave diagnosis facts behind
+that no retraction could take back. ``candidates()`` therefore reads the
+pending activations and maps each rule to the facts its body would
+declare.
+"""
+from collections import namedtuple
+
+from experta import Fact
+
+from .compiled import compile_rules
+from .knowledge import ComputerDiagnosis
+
+Candidate = namedtuple("Candidate", ["diagnosis", "recommendation", "rule"])
+
+
+class LiveSession:
+    """Persistent engine that follows symptom toggles one fact at a time"""
+
+    def __init__(self, engine_cls=ComputerDiagnosis):
+        self.engine = engine_cls()
+        self.engine.reset()
+        self._facts = {}
+
+        self._conclusions = {}
+        for rule in compile_rules(engine_cls).rules:
+            for content in rule.produces:
+                fact = dict(content)
+                if "diagnosis" in fact:
+                    self._conclusions[rule.name] = Candidate(
+                        fact["diagnosis"], fact.get("recommendation"), rule.name
+                    )
+
+    @property
+    def symptoms(self):
+        return frozenset(self._facts)
+
+    def set(self, symptom, present):
+        """Declare or retract one symptom; returns True if anything changed"""
+        if present and symptom not in self._facts:
+            self._facts[symptom] = self.engine.declare(Fact(symptom=symptom))
+            return True
+        if not present and symptom in self._facts:
+            self.engine.retract(self._facts.pop(symptom))
+            return True
+        return False
+
+    def toggle(self, symptom):
+        return self.set(symptom, symptom not in self._facts)
+
+    def clear(self):
+        """Retract every symptom, keeping the built network"""
+        for symptom in list(self._facts):
+            self.set(symptom, False)
+
+    def candidates(self):
+        """Diagnoses whose rules currently match, next-to-fire first"""
+        seen = set()
+        result = []
+        for activation in reversed(self.engine.agenda.activations):
+            name = activation.rule.__name__
+            candidate = self._conclusions.get(name)
+            if candidate is not None and name not in seen:
+                seen.add(name)
+                result.append(candidate)
+        return result
@@ -0,0 +1,236 @@
+"""Zero-copy batch diagnosis of memory-mapped symptom matrices.
+
+Fleet data arrives as one row per machine and one column per symptom of
+``SYMPTOM_NAMES``, in one of two layouts:
+
+* ``.npy`` -- an (N x symptoms) bool or integer array (non-zero means
+  present), or an (N x ceil(symptoms / 8)) ``uint8`` array of packed bits;
+* raw bit-packed -- any other file: rows of ceil(symptoms / 8) bytes with
+  symptom ``i`` in bit ``i % 8`` of byte ``i // 8`` (``np.packbits(...,
+  bitorder="little")``), no header.
+
+The input is memory-mapped and scored ``chunk_rows`` rows at a time with
+``CompiledEvaluator.fire_words``, so no ``Fact`` is created and only one
+chunk is ever resident. Packed rows are the evaluator's bitmask layout
+already and are only padded to 64-bit words.
+
+Results go to an (N x ceil(codes / 8)) ``uint8`` ``.npy`` file, also
+memory-mapped and packed the same way: bit ``j`` is set when the machine
+gets ``diagnosis_codes()[j]``. Worker processes each map the input and
+output files themselves and fill disjoint row ranges, so the input is
+shared through the page cache instead of being copied to every worker.
+
+    python -m diagnosis.matrix INPUT -o CODES.npy [--workers N] [--chunk-rows N]
+    python -m diagnosis.matrix --decode CODES.npy [--rows N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .catalog import SYMPTOM_NAMES
+from .compiled import compile_rules, np
+from .knowledge import ComputerDiagnosis
+
+DEFAULT_CHUNK_ROWS = 65536
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("memory-mapped batches require numpy")
+
+
+def packed_width(count=len(SYMPTOM_NAMES)):
+    """Bytes per bit-packed row of ``count`` columns"""
+    return (count + 7) // 8
+
+
+def open_matrix(path, packed=None):
+    """Read-only memory map of a symptom matrix; returns ``(array, packed)``
+
+    ``packed`` is inferred from the shape for ``.npy`` files and defaults
+    to True for raw files.
+    """
+    _require_numpy()
+    width = packed_width()
+    if path.endswith(".npy"):
+        array = np.load(path, mmap_mode="r")
+        if array.ndim != 2:
+            raise ValueError("%s: expected a 2-D array, got shape %s" % (path, array.shape))
+        if packed is None:
+            packed = array.shape[1] == width and array.dtype == np.uint8 and width != len(SYMPTOM_NAMES)
+    else:
+        if packed is False:
+            raise ValueError("%s: raw files must be bit-packed" % path)
+        packed = True
+        size = os.path.getsize(path)
+        if size % width:
+            raise ValueError("%s: size %d is not a multiple of the %d-byte row" % (path, size, width))
+        array = np.memmap(path, dtype=np.uint8, mode="r", shape=(size // width, width)) if size else \
+            np.zeros((0, width), dtype=np.uint8)
+
+    expected = width if packed else len(SYMPTOM_NAMES)
+    if array.shape[1] != expected:
+        raise ValueError("%s: expected %d columns, got %d" % (path, expected, array.shape[1]))
+    if packed and array.dtype != np.uint8:
+        raise ValueError("%s: packed rows must be uint8, got %s" % (path, array.dtype))
+    return array, packed
+
+
+def write_packed(path, matrix, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write an (N x symptoms) boolean matrix as a raw bit-packed file"""
+    _require_numpy()
+    with open(path, "wb") as out:
+        for start in range(0, len(matrix), chunk_rows):
+            chunk = np.asarray(matrix[start:start + chunk_rows], dtype=bool)
+            out.write(np.packbits(chunk, axis=1, bitorder="little").tobytes())
+
+
+class MatrixScorer:
+    """Scores symptom rows into packed diagnosis codes, chunk by chunk"""
+
+    def __init__(self, engine_cls=ComputerDiagnosis):
+        _require_numpy()
+        self.evaluator = compile_rules(engine_cls)
+        if self.evaluator.symptoms[:len(SYMPTOM_NAMES)] != SYMPTOM_NAMES:
+            raise ValueError("%s does not index symptoms in catalog order" % engine_cls.__name__)
+
+        # Diagnosis names in order of the first rule concluding them
+        codes = {}
+        for rule in self.evaluator.rules:
+            for content in rule.produces:
+                name = dict(content).get("diagnosis")
+                if name is not None:
+                    codes.setdefault(name, len(codes))
+        self.codes = tuple(codes)
+        # rules x codes: which code each rule's firing sets
+        self.concludes = np.zeros((len(self.evaluator.rules), len(codes)), dtype=np.uint8)
+        for rule in self.evaluator.rules:
+            for content in rule.produces:
+                name = dict(content).get("diagnosis")
+                if name is not None:
+                    self.concludes[rule.index, codes[name]] = 1
+
+    @property
+    def code_width(self):
+        return packed_width(len(self.codes))
+
+    def words(self, rows, packed):
+        """One chunk of input rows as the evaluator's uint64 bitmasks"""
+        width = self.evaluator.word_count * 8
+        padded = np.zeros((len(rows), width), dtype=np.uint8)
+        if packed:
+            padded[:, :rows.shape[1]] = rows
+            spare = -len(SYMPTOM_NAMES) % 8
+            if spare:  # padding bits of the last byte must not reach rule-only symptoms
+                padded[:, rows.shape[1] - 1] &= 0xFF >> spare
+        else:
+            bits = np.packbits(np.asarray(rows, dtype=bool), axis=1, bitorder="little")
+            padded[:, :bits.shape[1]] = bits
+        return padded.view("<u8")
+
+    def score(self, rows, packed):
+        """(n x input columns) -> (n x ``code_width``) packed diagnosis codes"""
+        fired = self.evaluator.fire_words(self.words(rows, packed))
+        hits = (fired.astype(np.uint8) @ self.concludes) > 0
+        return np.packbits(hits, axis=1, bitorder="little")
+
+    def decode(self, row):
+        """Diagnosis names set in one packed output row"""
+        bits = np.unpackbits(np.asarray(row, dtype=np.uint8), bitorder="little")
+        return [self.codes[j] for j in np.flatnonzero(bits[:len(self.codes)])]
+
+    def score_range(self, source, output, start, stop, packed, chunk_rows=DEFAULT_CHUNK_ROWS):
+        for chunk in range(start, stop, chunk_rows):
+            end = min(chunk + chunk_rows, stop)
+            output[chunk:end] = self.score(source[chunk:end], packed)
+
+
+def diagnosis_codes(engine_cls=ComputerDiagnosis):
+    """Diagnosis names in code order: bit ``j`` of an output row is ``codes[j]``"""
+    return MatrixScorer(engine_cls).codes
+
+
+# Worker side: each process maps the files itself and keeps its scorer
+_worker = None
+
+
+def _init_worker(source_path, output_path, packed):
+    global _worker
+    source, _ = open_matrix(source_path, packed)
+    output = np.load(output_path, mmap_mode="r+")
+    _worker = (MatrixScorer(), source, output, packed)
+
+
+def _score_range(start, stop, chunk_rows):
+    scorer, source, output, packed = _worker
+    started = time.perf_counter()
+    scorer.score_range(source, output, start, stop, packed, chunk_rows)
+    output.flush()
+    return os.getpid(), stop - start, time.perf_counter() - started
+
+
+def diagnose_matrix(source_path, output_path, workers=1, chunk_rows=DEFAULT_CHUNK_ROWS, packed=None):
+    """Score every row of ``source_path`` into a new ``.npy`` at ``output_path``
+
+    Returns a report with the code table and throughput. With
+    ``workers > 1`` chunk-sized row ranges go to a process pool.
+    """
+    source, packed = open_matrix(source_path, packed)
+    scorer = MatrixScorer()
+    rows = len(source)
+    output = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.uint8, shape=(rows, scorer.code_width))
+    started = time.perf_counter()
+    per_worker = {}
+
+    if workers <= 1 or rows <= chunk_rows:
+        scorer.score_range(source, output, 0, rows, packed, chunk_rows)
+        output.flush()
+        per_worker[os.getpid()] = rows
+    else:
+        del output  # workers reopen it; nothing may be written through this map
+        ranges = [(start, min(start + chunk_rows, rows), chunk_rows) for start in range(0, rows, chunk_rows)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(source_path, output_path, packed)) as executor:
+            for pid, count, _ in executor.map(_score_range, *zip(*ranges)):
+                per_worker[pid] = per_worker.get(pid, 0) + count
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "packed_input": packed,
+        "codes": list(scorer.codes),
+        "elapsed_seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed else 0.0,
+        "workers": per_worker,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diagnose a memory-mapped symptom matrix")
+    parser.add_argument("input", help=".npy matrix, raw bit-packed file, or codes .npy with --decode")
+    parser.add_argument("-o", "--output", help="output .npy of packed diagnosis codes")
+    parser.add_argument("--packed", action="store_true", default=None, help=".npy input holds packed bits")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--decode", action="store_true", help="print the diagnoses in a codes file as JSONL")
+    parser.add_argument("--rows", type=int, default=None, help="with --decode: only the first N rows")
+    args = parser.parse_args(argv)
+
+    if args.decode:
+        scorer = MatrixScorer()
+        codes = np.load(args.input, mmap_mode="r")
+        for row in codes[:args.rows]:
+            print(json.dumps(scorer.decode(row)))
+        return 0
+    if not args.output:
+        parser.error("-o/--output is required")
+    report = diagnose_matrix(args.input, args.output, args.workers, args.chunk_rows, args.packed)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Pool of pre-built ``ComputerDiagnosis`` engines.
+
+Building an engine compiles every ``@Rule`` into a Rete network, which
+costs several times more than a diagnosis itself. The pool builds each
+engine once and hands it out again after ``reset()``, which only clears
+the fact list, agenda and node memories and re-declares the ``@DefFacts``.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from .knowledge import ComputerDiagnosis
+
+DEFAULT_POOL_SIZE = 4
+
+
+class EnginePool:
+    """Thread-safe checkout/return pool of warm engines"""
+
+    def __init__(self, factory=ComputerDiagnosis, size=DEFAULT_POOL_SIZE, prebuild=0, profiler=None):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.factory = factory
+        self.size = size
+        self.profiler = profiler
+        self._idle = []
+        self._built = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._metrics = {
+            "checkouts": 0,
+            "hits": 0,
+            "builds": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "discards": 0,
+        }
+        for _ in range(min(prebuild, size)):
+            self._idle.append(self._build())
+            self._built += 1
+
+    def _build(self):
+        # experta binds rules to the instance through class-level
+        # descriptors while building the network; keep builds serialized.
+        with _BUILD_LOCK:
+            engine = self.factory()
+        if self.profiler is not None:
+            engine.profiler = self.profiler
+        with self._lock:
+            self._metrics["builds"] += 1
+        return engine
+
+    def acquire(self, timeout=None):
+        """Check out an engine reset to its ``@DefFacts`` state"""
+        build = False
+        with self._available:
+            self._metrics["checkouts"] += 1
+            if self._idle:
+                self._metrics["hits"] += 1
+            elif self._built < self.size:
+                self._built += 1
+                build = True
+            else:
+                self._metrics["waits"] += 1
+                started = time.perf_counter()
+                # A discarded engine frees its slot instead of coming back idle
+                ready = self._available.wait_for(lambda: self._idle or self._built < self.size, timeout)
+                self._metrics["wait_seconds"] += time.perf_counter() - started
+                if not ready:
+                    raise TimeoutError("no engine available within %ss" % timeout)
+                if not self._idle:
+                    self._built += 1
+                    build = True
+            engine = None if build else self._idle.pop()
+
+        try:
+            if build:
+                engine = self._build()
+            engine.reset()
+        except BaseException:
+            # Give the slot back, or every failure would shrink the pool for good
+            with self._available:
+                self._built -= 1
+                if engine is not None:  # built or idle, but failed to reset
+                    self._metrics["discards"] += 1
+                self._available.notify()
+            raise
+        return engine
+
+    def release(self, engine, discard=False):
+        """Return an engine; ``discard`` drops it so a fresh one gets built"""
+        with self._available:
+            if discard:
+                self._built -= 1
+                self._metrics["discards"] += 1
+            else:
+                self._idle.append(engine)
+            self._available.notify()
+
+    @contextmanager
+    def engine(self, timeout=None):
+        """``with pool.engine() as engine:`` — discards the engine on error"""
+        engine = self.acquire(timeout)
+        discard = False
+        try:
+            yield engine
+        except BaseException:
+            discard = True
+            raise
+        finally:
+            self.release(engine, discard=discard)
+
+    def metrics(self):
+        """Snapshot of the pool counters"""
+        with self._lock:
+            return dict(self._metrics, size=self.size, built=self._built, idle=len(self._idle))
+
+
+_BUILD_LOCK = threading.Lock()
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool():
+    """Process-wide pool used by ``diagnose()``"""
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = EnginePool()
+    return _default_pool
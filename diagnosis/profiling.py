@@ -0,0 +1,177 @@
+"""Opt-in per-rule profiling for ``DiagnosisEngine``.
+
+Attach a ``RuleProfiler`` to an engine and every run is recorded:
+
+    profiler = RuleProfiler()
+    engine.profiler = profiler
+    ...
+    print(profiler.to_prometheus())
+
+Per rule it counts activations (entries placed on the agenda) and fires
+and keeps cumulative and p99 fire time. Matching happens in the shared
+Rete network, where one node serves many rules, so match time is
+recorded per run: the time spent propagating fact changes to the agenda
+between ``reset()`` and the end of ``run()``. Each run also records the
+deepest the agenda got and the size of the fact base.
+
+With no profiler attached (the default) the engine only pays one
+attribute check per agenda step.
+"""
+import json
+import math
+import threading
+from collections import deque
+
+# Recent samples kept per series for quantiles
+DEFAULT_WINDOW = 1024
+
+
+class _Series:
+    """Count, sum and a bounded window of recent samples (seconds)"""
+
+    __slots__ = ("count", "total", "recent")
+
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.recent.append(value)
+
+    def quantile(self, q):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum_seconds": self.total,
+            "p50_seconds": self.quantile(0.5),
+            "p99_seconds": self.quantile(0.99),
+        }
+
+
+class RuleProfiler:
+    """Collects rule and run statistics from any number of engines"""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.activations = {}
+            self.fires = {}
+            self.fire_time = {}
+            self.runs = 0
+            self.match_time = _Series(self.window)
+            self.agenda_depth = _Series(self.window)
+            self.fact_count = _Series(self.window)
+            self.max_agenda_depth = 0
+
+    # Hooks called by the engine
+
+    def record_activations(self, added):
+        with self._lock:
+            for activation in added:
+                name = activation.rule.__name__
+                self.activations[name] = self.activations.get(name, 0) + 1
+
+    def record_fire(self, rule, seconds):
+        with self._lock:
+            self.fires[rule] = self.fires.get(rule, 0) + 1
+            series = self.fire_time.get(rule)
+            if series is None:
+                series = self.fire_time[rule] = _Series(self.window)
+            series.observe(seconds)
+
+    def record_run(self, match_seconds, agenda_depth, facts):
+        with self._lock:
+            self.runs += 1
+            self.match_time.observe(match_seconds)
+            self.agenda_depth.observe(agenda_depth)
+            self.fact_count.observe(facts)
+            self.max_agenda_depth = max(self.max_agenda_depth, agenda_depth)
+
+    # Export
+
+    def snapshot(self):
+        with self._lock:
+            rules = {}
+            for name in sorted(set(self.activations) | set(self.fires)):
+                series = self.fire_time.get(name)
+                rules[name] = {
+                    "activations": self.activations.get(name, 0),
+                    "fires": self.fires.get(name, 0),
+                    "fire": series.snapshot() if series else _Series(0).snapshot(),
+                }
+            return {
+                "runs": self.runs,
+                "match": self.match_time.snapshot(),
+                "agenda_depth": {
+                    "max": self.max_agenda_depth,
+                    "p99": self.agenda_depth.quantile(0.99),
+                    "mean": self.agenda_depth.total / self.runs if self.runs else 0.0,
+                },
+                "facts": {
+                    "p99": self.fact_count.quantile(0.99),
+                    "mean": self.fact_count.total / self.runs if self.runs else 0.0,
+                },
+                "rules": rules,
+            }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self, prefix="diagnosis"):
+        """Prometheus text exposition format (version 0.0.4)"""
+        data = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append("# HELP %s_%s %s" % (prefix, name, help_text))
+            lines.append("# TYPE %s_%s %s" % (prefix, name, kind))
+            for suffix, labels, value in samples:
+                label_text = ",".join('%s="%s"' % (key, _escape(val)) for key, val in labels)
+                lines.append("%s_%s%s%s %s" % (
+                    prefix, name, suffix, "{%s}" % label_text if label_text else "", _number(value)))
+
+        def summary(series, labels=()):
+            return [
+                ("", labels + (("quantile", "0.5"),), series["p50_seconds"]),
+                ("", labels + (("quantile", "0.99"),), series["p99_seconds"]),
+                ("_sum", labels, series["sum_seconds"]),
+                ("_count", labels, series["count"]),
+            ]
+
+        rules = data["rules"]
+        metric("rule_activations_total", "counter", "Activations placed on the agenda per rule",
+               [("", (("rule", name),), row["activations"]) for name, row in rules.items()])
+        metric("rule_fires_total", "counter", "Rule firings per rule",
+               [("", (("rule", name),), row["fires"]) for name, row in rules.items()])
+        metric("rule_fire_seconds", "summary", "Time spent in rule bodies",
+               [sample for name, row in rules.items() for sample in summary(row["fire"], (("rule", name),))])
+        metric("match_seconds", "summary", "Time propagating fact changes to the agenda per run",
+               summary(data["match"]))
+        metric("runs_total", "counter", "Completed engine runs", [("", (), data["runs"])])
+        metric("agenda_depth_max", "gauge", "Deepest agenda seen in any run",
+               [("", (), data["agenda_depth"]["max"])])
+        metric("agenda_depth_mean", "gauge", "Mean of the deepest agenda per run",
+               [("", (), data["agenda_depth"]["mean"])])
+        metric("facts_mean", "gauge", "Mean fact-base size at the end of a run",
+               [("", (), data["facts"]["mean"])])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
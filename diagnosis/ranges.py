@@ -0,0 +1,133 @@
+"""Numeric range conditions and the interval index that matches them.
+
+A rule tests a reading such as ``Fact(cpu_temp=92)`` with
+``Fact(cpu_temp=P(Range(90, None)))``. ``Range`` is the predicate: a
+picklable, comparable value that the Rete matcher can recognise. Plain
+lambdas cannot be indexed.
+
+``IntervalIndex`` is a centered interval tree over the ranges of one
+slot. ``stab(value)`` walks one root-to-leaf path and returns every
+payload whose range contains the value. That costs O(log n + k) for n
+ranges and k matches, however many threshold rules there are.
+"""
+import bisect
+from collections import namedtuple
+
+_INFINITY = float("inf")
+
+
+def is_number(value):
+    """True for ints and floats a range can compare; bools and NaN are not"""
+    return not isinstance(value, bool) and isinstance(value, (int, float)) and value == value
+
+
+class Range(namedtuple("Range", ["low", "high", "low_inclusive", "high_inclusive"])):
+    """``low <(=) value <(=) high``; ``None`` leaves a side open"""
+
+    __slots__ = ()
+
+    def __new__(cls, low=None, high=None, low_inclusive=True, high_inclusive=False):
+        if low is not None and high is not None and (low > high or (low == high and not (
+                low_inclusive and high_inclusive))):
+            raise ValueError("empty range: %r .. %r" % (low, high))
+        return super().__new__(cls, low, high, low_inclusive, high_inclusive)
+
+    @classmethod
+    def from_ops(cls, bounds):
+        """Range from ``{">=": 85, "<": 100}``-style comparisons"""
+        low = high = None
+        low_inclusive = high_inclusive = True
+        for op, limit in bounds.items():
+            if op in (">", ">="):
+                low, low_inclusive = limit, op == ">="
+            elif op in ("<", "<="):
+                high, high_inclusive = limit, op == "<="
+            elif op == "==":
+                low = high = limit
+                low_inclusive = high_inclusive = True
+            else:
+                raise ValueError("unknown comparison %r" % (op,))
+        return cls(low, high, low_inclusive, high_inclusive)
+
+    def __call__(self, value):
+        if not is_number(value):
+            return False
+        if self.low is not None and (value < self.low or (value == self.low and not self.low_inclusive)):
+            return False
+        if self.high is not None and (value > self.high or (value == self.high and not self.high_inclusive)):
+            return False
+        return True
+
+    @property
+    def bounds(self):
+        """``(low, high)`` with open sides as infinities"""
+        return (-_INFINITY if self.low is None else self.low,
+                _INFINITY if self.high is None else self.high)
+
+    def __repr__(self):
+        parts = []
+        if self.low is not None:
+            parts.append("%r %s" % (self.low, "<=" if self.low_inclusive else "<"))
+        parts.append("x")
+        if self.high is not None:
+            parts.append("%s %r" % ("<=" if self.high_inclusive else "<", self.high))
+        return "Range(%s)" % " ".join(parts)
+
+
+class _TreeNode:
+    __slots__ = ("center", "by_low", "lows", "by_high", "highs", "left", "right")
+
+
+class IntervalIndex:
+    """Centered interval tree mapping values to the payloads of their ranges"""
+
+    def __init__(self, entries):
+        """``entries`` is an iterable of ``(Range, payload)`` pairs"""
+        self.entries = list(entries)
+        self.root = self._build(self.entries)
+
+    def _build(self, entries):
+        if not entries:
+            return None
+        points = sorted(point for entry in entries for point in entry[0].bounds if abs(point) != _INFINITY)
+        center = points[len(points) // 2] if points else 0
+        here, left, right = [], [], []
+        for entry in entries:
+            low, high = entry[0].bounds
+            if high < center:
+                left.append(entry)
+            elif low > center:
+                right.append(entry)
+            else:
+                here.append(entry)
+        node = _TreeNode()
+        node.center = center
+        # Ranges containing the center, ascending by low and descending by high
+        node.by_low = sorted(here, key=lambda entry: entry[0].bounds[0])
+        node.lows = [entry[0].bounds[0] for entry in node.by_low]
+        node.by_high = sorted(here, key=lambda entry: -entry[0].bounds[1])
+        node.highs = [-entry[0].bounds[1] for entry in node.by_high]
+        node.left = self._build(left)
+        node.right = self._build(right)
+        return node
+
+    def stab(self, value):
+        """Payloads of every range containing ``value``, which ``is_number``"""
+        found = []
+        node = self.root
+        while node is not None:
+            if value < node.center:
+                # Every range here reaches the center; only its low bound matters
+                candidates = node.by_low[:bisect.bisect_right(node.lows, value)]
+                node = node.left
+            elif value > node.center:
+                candidates = node.by_high[:bisect.bisect_right(node.highs, -value)]
+                node = node.right
+            else:
+                candidates = node.by_low
+                node = None
+            found.extend(payload for bounds, payload in candidates if bounds(value))
+        return found
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,62 @@
+"""Immutable diagnosis result objects."""
+from collections import namedtuple
+
+# One concluded diagnosis: ``rule`` is the rule whose body declared it and
+# ``order`` the 1-based firing number of that rule within the run
+# (0 when declared outside a run).
+Diagnosis = namedtuple("Diagnosis", ["diagnosis", "recommendation", "rule", "order"])
+
+
+class DiagnosisResult(tuple):
+    """Every diagnosis of a run, ranked by the order the agenda fired them
+
+    The agenda pops the highest-priority activation first, so the first
+    entry is the engine's preferred answer; ``diagnosis`` and
+    ``recommendation`` read from it. An empty result means nothing matched.
+    ``truncated`` is true when a run limit or time budget stopped the
+    engine with rules still waiting to fire.
+    """
+
+    __slots__ = ()
+
+    # A class attribute, so instances cannot reassign it
+    truncated = False
+
+    def __new__(cls, diagnoses=(), truncated=False):
+        if truncated:
+            cls = _TruncatedResult
+        return super().__new__(cls, diagnoses)
+
+    @property
+    def primary(self):
+        return self[0] if self else None
+
+    @property
+    def diagnosis(self):
+        return self[0].diagnosis if self else None
+
+    @property
+    def recommendation(self):
+        return self[0].recommendation if self else None
+
+    def as_dict(self):
+        return {
+            "diagnosis": self.diagnosis,
+            "recommendation": self.recommendation,
+            "diagnoses": [entry._asdict() for entry in self],
+            "truncated": self.truncated,
+        }
+
+    def __repr__(self):
+        entries = [repr(entry) for entry in self]
+        if self.truncated:
+            entries.append("truncated=True")
+        return "DiagnosisResult(%s)" % ", ".join(entries)
+
+
+class _TruncatedResult(DiagnosisResult):
+    """``DiagnosisResult`` of a run stopped with activations left unfired"""
+
+    __slots__ = ()
+
+    truncated = True
@@ -0,0 +1,213 @@
+"""Rete matcher with hashed dispatch on literal slot values.
+
+experta's alpha network gives every ``Fact(symptom="...")`` pattern its
+own feature-test node under the shared ``Fact`` type node, so declaring
+one symptom runs one equality test per distinct symptom value mentioned
+by any rule. ``changes()`` then polls the conflict-set node of every
+rule. Both costs grow with the size of the knowledge base, even though a
+symptom only concerns the handful of rules that name it.
+
+``IndexedReteMatcher`` builds the same network and then:
+
+* replaces each group of sibling ``slot == literal`` tests (``symptom``,
+  ``diagnosis``, ``action``, ...) by one ``ValueIndexNode`` that looks
+  the fact's value up in a dict and only activates the matching child;
+* replaces each group of sibling numeric range tests on one slot
+  (``Fact(cpu_temp=P(Range(90, None)))``) by a ``RangeIndexNode`` that
+  finds the ranges containing the value in an interval tree;
+* remembers which conflict-set nodes a change reached and collects
+  activations from those alone, in the order experta would have, so
+  agenda tie-breaks and firing order are unchanged;
+* resets every node exactly once instead of once per path to it.
+"""
+from experta.fieldconstraint import L, P
+from experta.matchers.rete import ReteMatcher
+from experta.matchers.rete.check import FeatureCheck
+from experta.matchers.rete.mixins import ChildNode
+from experta.matchers.rete.nodes import ConflictSetNode, FeatureTesterNode
+
+from .ranges import IntervalIndex, Range, is_number
+
+
+def _literal_slot(node):
+    """``(slot, value)`` when ``node`` only tests ``fact[slot] == value``"""
+    if type(node) is not FeatureTesterNode or not isinstance(node.matcher, FeatureCheck):
+        return None
+    check = node.matcher
+    if not isinstance(check.how, L) or check.how.__bind__ is not None:
+        return None
+    if not isinstance(check.what, str) or "__" in check.what:
+        return None
+    try:
+        hash(check.how.value)
+    except TypeError:
+        return None
+    return check.what, check.how.value
+
+
+def _range_slot(node):
+    """``(slot, Range)`` when ``node`` only tests ``fact[slot]`` against a ``Range``"""
+    if type(node) is not FeatureTesterNode or not isinstance(node.matcher, FeatureCheck):
+        return None
+    check = node.matcher
+    if not isinstance(check.how, P) or check.how.__bind__ is not None or not isinstance(check.how.match, Range):
+        return None
+    if not isinstance(check.what, str) or "__" in check.what:
+        return None
+    return check.what, check.how.match
+
+
+class ValueIndexNode:
+    """Dispatch a token to the child testing the fact's value for ``slot``"""
+
+    def __init__(self, slot, children):
+        self.slot = slot
+        self.children = [child for _, child in children]
+        self.table = {}
+        for value, child in children:
+            self.table.setdefault(value, []).append(child)
+
+    def activate(self, token):
+        fact, = token.data
+        try:
+            value = fact[self.slot]
+        except (KeyError, TypeError):
+            return
+        try:
+            targets = self.table.get(value, ())
+        except TypeError:
+            targets = self.children  # unhashable value: let every test decide
+        for child in targets:
+            child.callback(token)
+
+    def reset(self):
+        for child in self.children:
+            child.node.reset()
+
+    def __str__(self):  # pragma: no cover
+        return "%s: %s (%d values)" % (self.__class__.__name__, self.slot, len(self.table))
+
+
+class RangeIndexNode:
+    """Dispatch a token to the children whose range contains the fact's value"""
+
+    def __init__(self, slot, children):
+        self.slot = slot
+        self.children = [child for _, child in children]
+        self.index = IntervalIndex(children)
+
+    def activate(self, token):
+        fact, = token.data
+        try:
+            value = fact[self.slot]
+        except (KeyError, TypeError):
+            return
+        if not is_number(value):
+            return  # no range holds it, as ``Range.__call__`` agrees
+        for child in self.index.stab(value):
+            child.callback(token)
+
+    def reset(self):
+        for child in self.children:
+            child.node.reset()
+
+    def __str__(self):  # pragma: no cover
+        return "%s: %s (%d ranges)" % (self.__class__.__name__, self.slot, len(self.index))
+
+
+class _DirtyTracker:
+    """Conflict-set node callback that first marks the node dirty
+
+    A class rather than a closure so built networks can be pickled.
+    """
+
+    __slots__ = ("dirty", "csn", "callback")
+
+    def __init__(self, dirty, csn, callback):
+        self.dirty = dirty
+        self.csn = csn
+        self.callback = callback
+
+    def __call__(self, token):
+        self.dirty.add(self.csn)
+        return self.callback(token)
+
+    @property
+    def __name__(self):
+        return self.callback.__name__
+
+
+class IndexedReteMatcher(ReteMatcher):
+    """``ReteMatcher`` whose per-fact cost follows the rules a fact concerns"""
+
+    def __init__(self, *args, **kwargs):
+        self._dirty = set()
+        super().__init__(*args, **kwargs)
+
+    def build_network(self):
+        super().build_network()
+        # Activation order must match experta's walk of the unindexed network
+        self._position = {node: index for index, node in enumerate(self._get_conflict_set_nodes())}
+
+        self._nodes = []
+        seen = set()
+        stack = [self.root_node]
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            self._nodes.append(node)
+            self._index_children(node)
+            self._track_conflict_sets(node)
+            stack.extend(child.node for child in node.children)
+
+    def _index_children(self, node):
+        if isinstance(node, (ValueIndexNode, RangeIndexNode)):
+            return
+        groups = {}
+        for child in node.children:
+            literal = _literal_slot(child.node)
+            if literal is not None:
+                groups.setdefault((ValueIndexNode, literal[0]), []).append((literal[1], child))
+                continue
+            bounds = _range_slot(child.node)
+            if bounds is not None:
+                groups.setdefault((RangeIndexNode, bounds[0]), []).append((bounds[1], child))
+        for (kind, slot), children in groups.items():
+            if len(children) < 2:
+                continue
+            grouped = {id(child) for _, child in children}
+            index = kind(slot, children)
+            node.children = [child for child in node.children if id(child) not in grouped]
+            node.children.append(ChildNode(index, index.activate))
+
+    def _track_conflict_sets(self, node):
+        for number, child in enumerate(node.children):
+            if isinstance(child.node, ConflictSetNode):
+                node.children[number] = ChildNode(child.node, _DirtyTracker(self._dirty, child.node, child.callback))
+
+    def changes(self, adding=None, deleting=None):
+        if deleting is not None:
+            for deleted in deleting:
+                self.root_node.remove(deleted)
+        if adding is not None:
+            for added in adding:
+                self.root_node.add(added)
+
+        added = []
+        removed = []
+        if self._dirty:
+            touched = sorted(self._dirty, key=self._position.__getitem__)
+            self._dirty.clear()
+            for csn in touched:
+                c_added, c_removed = csn.get_activations()
+                added.extend(c_added)
+                removed.extend(c_removed)
+        return added, removed
+
+    def reset(self):
+        for node in self._nodes:
+            reset = getattr(node, "_reset", None)
+            if reset is not None:
+                reset()
@@ -0,0 +1,327 @@
+"""Local asyncio HTTP/JSON diagnosis service.
+
+Endpoints:
+
+* ``POST /diagnose`` -- ``{"symptoms": [...]}`` -> one result
+* ``POST /diagnose/batch`` -- ``{"cases": [[...], {"id": ..., "symptoms": [...]}, ...]}``
+* ``GET /metrics`` -- latency histograms, queue and pool counters
+* ``GET /metrics/rules`` -- per-rule profile in Prometheus text format
+  (thread mode with ``profile=True`` only)
+* ``GET /health``
+
+Engine runs are CPU-bound, so they go to a bounded thread pool (sharing
+an ``EnginePool``) or, with ``processes=True``, a process pool whose
+workers each hold a warm engine. The event loop only parses requests and
+writes responses. At most ``workers + queue_size`` jobs are admitted at a
+time; anything beyond that is answered ``429 Too Many Requests`` at once
+instead of queueing without bound.
+
+Only the standard library is used, and the service binds to 127.0.0.1 by
+default: ``python -m diagnosis.service --port 8080``.
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+
+from .core import diagnose
+from .pool import EnginePool
+from .profiling import RuleProfiler
+
+logger = logging.getLogger(__name__)
+
+# Paths with their own latency histogram; every other path counts as "other"
+ROUTES = ("/health", "/metrics", "/metrics/rules", "/diagnose", "/diagnose/batch")
+
+MAX_BODY_BYTES = 1 << 20
+MAX_BATCH_CASES = 10000
+
+# Histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (cumulative counts, like Prometheus)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.total += ms
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum_ms": self.total,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+
+
+# Process-pool side: one warm engine per worker
+_worker_pool = None
+
+
+def _init_worker():
+    global _worker_pool
+    _worker_pool = EnginePool(size=1, prebuild=1)
+
+
+def _diagnose_in_worker(cases):
+    return [diagnose(symptoms, pool=_worker_pool).as_dict() for symptoms in cases]
+
+
+class DiagnosisService:
+    """HTTP front end with bounded admission and per-endpoint latency"""
+
+    def __init__(self, host="127.0.0.1", port=8080, workers=4, queue_size=64, processes=False,
+                 profile=False):
+        if processes and profile:
+            raise ValueError("rule profiling is only available with in-process workers")
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.processes = processes
+        self.admitted = 0
+        self.rejected = 0
+        self.latency = {}
+        self.server = None
+        self.profiler = RuleProfiler() if profile else None
+        if processes:
+            self.pool = None
+            # Forking from inside the running event loop can deadlock the
+            # executor's manager thread; spawned workers start clean
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            self.pool = EnginePool(size=workers, profiler=self.profiler)
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="diagnose")
+
+    # Engine work, run on the executor
+
+    def _diagnose_cases(self, cases):
+        return [diagnose(symptoms, pool=self.pool).as_dict() for symptoms in cases]
+
+    async def _run(self, cases):
+        if self.admitted >= self.capacity:
+            self.rejected += 1
+            raise HTTPError(429, "diagnosis queue is full")
+        self.admitted += 1
+        try:
+            loop = asyncio.get_running_loop()
+            if self.processes:
+                return await loop.run_in_executor(self.executor, _diagnose_in_worker, cases)
+            return await loop.run_in_executor(self.executor, self._diagnose_cases, cases)
+        finally:
+            self.admitted -= 1
+
+    # Endpoints
+
+    async def handle_diagnose(self, body):
+        symptoms = _symptoms(body.get("symptoms") if isinstance(body, dict) else body)
+        results = await self._run([symptoms])
+        return results[0]
+
+    async def handle_batch(self, body):
+        cases = body.get("cases") if isinstance(body, dict) else body
+        if not isinstance(cases, list):
+            raise HTTPError(400, "expected a list of cases")
+        if len(cases) > MAX_BATCH_CASES:
+            raise HTTPError(413, "at most %d cases per batch" % MAX_BATCH_CASES)
+        ids = []
+        symptom_lists = []
+        for number, case in enumerate(cases):
+            if isinstance(case, dict):
+                ids.append(case.get("id", number))
+                symptom_lists.append(_symptoms(case.get("symptoms")))
+            else:
+                ids.append(number)
+                symptom_lists.append(_symptoms(case))
+        results = await self._run(symptom_lists)
+        return {"results": [dict(result, id=case_id) for case_id, result in zip(ids, results)]}
+
+    def metrics(self):
+        return {
+            "in_flight": self.admitted,
+            "capacity": self.capacity,
+            "rejected": self.rejected,
+            "latency": {route: histogram.snapshot() for route, histogram in self.latency.items()},
+            "pool": self.pool.metrics() if self.pool else None,
+            "rules": self.profiler.snapshot() if self.profiler else None,
+        }
+
+    async def dispatch(self, method, path, body):
+        if path == "/health" and method == "GET":
+            return {"status": "ok"}
+        if path == "/metrics" and method == "GET":
+            return self.metrics()
+        if path == "/metrics/rules" and method == "GET" and self.profiler is not None:
+            return self.profiler.to_prometheus()
+        if path == "/diagnose" and method == "POST":
+            return await self.handle_diagnose(_json(body))
+        if path == "/diagnose/batch" and method == "POST":
+            return await self.handle_batch(_json(body))
+        if path in ("/health", "/metrics", "/diagnose", "/diagnose/batch"):
+            raise HTTPError(405)
+        raise HTTPError(404)
+
+    # HTTP/1.1 plumbing
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                started = time.perf_counter()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+                path = target.split("?", 1)[0]
+                try:
+                    try:
+                        length = int(headers.get("content-length", 0))
+                    except ValueError:
+                        raise HTTPError(400, "invalid Content-Length") from None
+                    if length < 0:
+                        raise HTTPError(400, "invalid Content-Length")
+                    if length > MAX_BODY_BYTES:
+                        raise HTTPError(413)
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = 200, await self.dispatch(method, path, body)
+                except HTTPError as exc:
+                    status, payload = exc.status, {"error": str(exc)}
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception:
+                    logger.exception("%s %s failed", method, path)
+                    status, payload = 500, {"error": "internal error"}
+
+                self.latency.setdefault(path if path in ROUTES else "other", LatencyHistogram()).observe(
+                    (time.perf_counter() - started) * 1000)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive or status == 413:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        head = [
+            "HTTP/1.1 %d %s" % (status, HTTPStatus(status).phrase),
+            "Content-Type: %s" % content_type,
+            "Content-Length: %d" % len(body),
+            "Connection: %s" % ("keep-alive" if keep_alive else "close"),
+        ]
+        if status == 429:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _json(body):
+    try:
+        return json.loads(body or b"null")
+    except ValueError:
+        raise HTTPError(400, "body is not valid JSON")
+
+
+def _symptoms(value):
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise HTTPError(400, "symptoms must be a list of strings")
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local diagnosis HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--processes", action="store_true", help="run engines in worker processes")
+    parser.add_argument("--profile", action="store_true", help="record per-rule statistics")
+    args = parser.parse_args(argv)
+
+    service = DiagnosisService(args.host, args.port, args.workers, args.queue_size, args.processes,
+                               args.profile)
+    print("Serving diagnosis on http://%s:%d" % (args.host, args.port))
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
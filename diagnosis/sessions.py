@@ -0,0 +1,215 @@
+"""Compact store for many concurrent diagnosis sessions.
+
+A session only keeps what the user selected and the last result:
+
+* ``mask`` -- the selected symptoms as an integer bitmask over
+  ``SYMPTOM_NAMES`` (bit ``i`` is ``SYMPTOM_NAMES[i]``);
+* ``result`` -- the last ``DiagnosisResult`` or ``None``, shared through a
+  ``ResultCache`` keyed by the mask, so sessions with the same selection
+  point at one result object;
+* ``touched`` -- when it was last used, for idle expiry.
+
+No engine, fact list or Tk variable is held per session. An engine is
+checked out of the shared ``EnginePool`` only when ``diagnose()`` misses
+the result cache, and returned as soon as the run is over.
+
+Measured footprint on CPython 3.11 (64-bit), store bookkeeping included,
+with the default integer session ids: about 215 bytes per session (see
+``measure_footprint()``). Results are counted once per distinct
+selection, not per session.
+
+Sessions are evicted least-recently-used first once the store holds
+``maxsize`` of them, and expire after ``ttl`` idle seconds.
+"""
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from .cache import ResultCache
+from .catalog import SYMPTOM_NAMES
+from .core import diagnose
+
+DEFAULT_MAX_SESSIONS = 100000
+
+_BITS = {name: 1 << bit for bit, name in enumerate(SYMPTOM_NAMES)}
+
+
+class Session:
+    """Selected symptoms as a bitmask, plus the last result"""
+
+    __slots__ = ("mask", "result", "touched")
+
+    def __init__(self, mask=0, result=None, touched=0.0):
+        self.mask = mask
+        self.result = result
+        self.touched = touched
+
+    @property
+    def symptoms(self):
+        """Selected symptom names, in catalog order"""
+        return [name for name, bit in _BITS.items() if self.mask & bit]
+
+    def __repr__(self):
+        return "Session(symptoms=%r, result=%r)" % (self.symptoms, self.result)
+
+
+def encode(symptoms):
+    """Bitmask of catalog symptom names; raises ``ValueError`` for unknown ones"""
+    mask = 0
+    for symptom in symptoms:
+        try:
+            mask |= _BITS[symptom]
+        except KeyError:
+            raise ValueError("unknown symptom %r" % (symptom,)) from None
+    return mask
+
+
+class SessionStore:
+    """Thread-safe LRU store of ``Session`` objects with idle expiry"""
+
+    def __init__(self, maxsize=DEFAULT_MAX_SESSIONS, ttl=None, pool=None, cache=None, clock=time.monotonic):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        if cache is None:
+            compute = diagnose if pool is None else (lambda symptoms: diagnose(symptoms, pool=pool))
+            cache = ResultCache(compute=compute)
+        self.cache = cache
+        self._sessions = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "evictions": 0, "expirations": 0, "diagnoses": 0}
+
+    def _expire(self, now):
+        # Least recently used first, so the expired sessions are all at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.touched < self.ttl:
+                return
+            del self._sessions[session_id]
+            self._stats["expirations"] += 1
+
+    def _get(self, session_id):
+        now = self.clock()
+        if self.ttl is not None:
+            self._expire(now)
+        session = self._sessions[session_id]
+        session.touched = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def create(self, symptoms=(), session_id=None):
+        """Open a session and return its id (a fresh integer unless given)"""
+        mask = encode(symptoms)
+        with self._lock:
+            if session_id is None:
+                session_id = next(self._ids)
+            self._sessions[session_id] = Session(mask, None, self.clock())
+            self._sessions.move_to_end(session_id)
+            self._stats["created"] += 1
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+                self._stats["evictions"] += 1
+        return session_id
+
+    def get(self, session_id):
+        """The session; ``KeyError`` when it was closed, evicted or expired"""
+        with self._lock:
+            return self._get(session_id)
+
+    def set(self, session_id, symptom, present=True):
+        """Select or deselect one symptom; returns True if the selection changed"""
+        bit = encode((symptom,))
+        with self._lock:
+            session = self._get(session_id)
+            mask = session.mask | bit if present else session.mask & ~bit
+            if mask == session.mask:
+                return False
+            session.mask = mask
+            session.result = None
+            return True
+
+    def toggle(self, session_id, symptom):
+        bit = encode((symptom,))
+        with self._lock:
+            session = self._get(session_id)
+            session.mask ^= bit
+            session.result = None
+            return bool(session.mask & bit)
+
+    def select(self, session_id, symptoms):
+        """Replace the whole selection"""
+        mask = encode(symptoms)
+        with self._lock:
+            session = self._get(session_id)
+            if mask != session.mask:
+                session.mask = mask
+                session.result = None
+
+    def diagnose(self, session_id):
+        """Diagnose the session's selection, borrowing a pooled engine on a cache miss"""
+        with self._lock:
+            session = self._get(session_id)
+            if session.result is not None:
+                return session.result
+            mask = session.mask
+        # The engine runs outside the store lock; other sessions stay usable
+        result = self.cache.diagnose(mask)
+        with self._lock:
+            self._stats["diagnoses"] += 1
+            if session.mask == mask:
+                session.result = result
+        return result
+
+    def close(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def sweep(self):
+        """Drop expired sessions now instead of on the next access"""
+        if self.ttl is not None:
+            with self._lock:
+                self._expire(self.clock())
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, sessions=len(self._sessions), maxsize=self.maxsize, cache=self.cache.stats())
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+
+def measure_footprint(count=100000, selected=5, seed=0):
+    """Bytes per session measured with ``tracemalloc``, result cache excluded
+
+    Each session gets ``selected`` random symptoms and a diagnosis.
+    """
+    import random
+    import tracemalloc
+
+    rng = random.Random(seed)
+    selections = [rng.sample(SYMPTOM_NAMES, selected) for _ in range(count)]
+    results = ResultCache(maxsize=count)
+    store = SessionStore(maxsize=count, cache=results)
+    # Fill the result cache first so only the sessions are measured
+    for symptoms in selections:
+        results.diagnose(encode(symptoms))
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for symptoms in selections:
+        store.diagnose(store.create(symptoms))
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+if __name__ == "__main__":
+    print("%.0f bytes per session" % measure_footprint(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
@@ -0,0 +1,371 @@
+"""Versioned on-disk snapshots of a built, reset engine.
+
+Building an engine compiles every ``@Rule`` into a Rete network; with a
+generated knowledge base that takes seconds. A snapshot is the engine
+right after ``reset()`` -- network, node memories, the ``@DefFacts`` in
+the fact list and the agenda -- pickled once and loaded back instead.
+
+File layout::
+
+    MAGIC (8 bytes) | header length (4 bytes, big endian) | JSON header | pickle
+
+The header records ``SNAPSHOT_VERSION``, the engine class and its
+``rules_fingerprint``. A snapshot whose version or fingerprint does not
+match the engine class being loaded raises ``SnapshotError``;
+``load_or_build`` then rebuilds the engine and rewrites the file.
+
+Rules, ``@DefFacts`` and the engine class are stored by name and taken
+from the loaded class, so a snapshot never carries code. Unpickling only
+resolves the classes an engine is made of -- experta's facts, agenda and
+Rete nodes, this package's index nodes and ranges, a few ``collections``
+containers -- and looks up nothing but public methods of such objects, so
+a crafted file cannot reach arbitrary callables. Loading maps the file
+and unpickles straight from the mapping.
+
+    python -m diagnosis.snapshot save|info|bench PATH [--kb KB_FILE]
+"""
+import argparse
+import copyreg
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import time
+from functools import lru_cache
+
+from experta import DefFacts, Fact, Rule
+from experta.conditionalelement import ConditionalElement
+from experta.matchers.rete.check import FeatureCheck
+from experta.matchers.rete.token import TokenInfo
+
+from .compiled import _class_members
+from .knowledge import ComputerDiagnosis, rules_fingerprint
+
+MAGIC = b"DIAGSNAP"
+SNAPSHOT_VERSION = 1
+
+_LENGTH = struct.Struct(">I")
+
+# Modules whose classes a snapshot may instantiate
+_SAFE_MODULES = frozenset([
+    "experta.activation", "experta.agenda", "experta.conditionalelement", "experta.fact",
+    "experta.factlist", "experta.fieldconstraint", "experta.frozenfact", "experta.strategies",
+    "experta.utils", "experta.matchers.rete.check", "experta.matchers.rete.mixins",
+    "experta.matchers.rete.nodes", "experta.matchers.rete.token",
+    "diagnosis.ranges", "diagnosis.rete",
+])
+_SAFE_GLOBALS = frozenset([
+    ("collections", "Counter"), ("collections", "OrderedDict"), ("collections", "deque"),
+    ("collections", "defaultdict"),
+])
+
+
+class SnapshotError(ValueError):
+    """Snapshot file is unreadable, from another version or for other rules"""
+
+
+def _qualname(engine_cls):
+    return "%s.%s" % (engine_cls.__module__, engine_cls.__qualname__)
+
+
+def _members(engine_cls):
+    return {name: obj for kind in (Rule, DefFacts) for name, obj in _class_members(engine_cls, kind)}
+
+
+class _Pickler(pickle.Pickler):
+    """Stores rules, DefFacts and the engine class as references by name"""
+
+    def __init__(self, file, engine_cls):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.engine_cls = engine_cls
+        # The network holds copies of some rules (``Rule.new_conditions``),
+        # so rules are recognised by their body rather than by identity
+        self.names = {id(obj._wrapped): name for name, obj in _members(engine_cls).items()}
+
+    def persistent_id(self, obj):
+        if obj is self.engine_cls:
+            return ("class",)
+        if isinstance(obj, DefFacts):
+            return ("member", self.names[id(obj._wrapped)])
+        if isinstance(obj, Rule):
+            name = self.names.get(id(obj._wrapped))
+            if name is None:
+                raise pickle.PicklingError("rule %r is not defined by %s" % (obj, self.engine_cls.__name__))
+            return ("rule", name, tuple(obj))
+        return None
+
+    def reducer_override(self, obj):
+        # FeatureCheck holds a closure; it is interned on (what, how) anyway
+        if type(obj) is FeatureCheck:
+            return FeatureCheck, (obj.what, obj.how)
+        # Conditional elements are tuples whose __new__ takes the members as
+        # separate arguments; the default reduce would pass one tuple
+        if isinstance(obj, ConditionalElement):
+            return copyreg.__newobj__, (type(obj),) + tuple(obj), vars(obj) or None
+        # Facts validate and freeze every item on __setitem__; their items
+        # were frozen when first declared, so restore them wholesale
+        if isinstance(obj, Fact):
+            return _restore_fact, (type(obj), dict(obj), vars(obj))
+        # TokenInfo.__new__ takes the context as a mapping, not as pairs
+        if type(obj) is TokenInfo:
+            return TokenInfo, (obj.data, dict(obj.context))
+        return NotImplemented
+
+
+def _method(obj, name):
+    """``getattr`` as pickled for bound methods, limited to public methods of safe objects"""
+    if type(obj).__module__ not in _SAFE_MODULES or name.startswith("_"):
+        raise SnapshotError("snapshot looks up %s.%s" % (type(obj).__name__, name))
+    method = getattr(obj, name)
+    if getattr(method, "__self__", None) is not obj:
+        raise SnapshotError("snapshot looks up %s.%s, which is not a method" % (type(obj).__name__, name))
+    return method
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, engine_cls):
+        super().__init__(file)
+        self.engine_cls = engine_cls
+        self.members = _members(engine_cls)
+        self.copies = {}
+
+    def find_class(self, module, name):
+        if (module, name) == ("builtins", "getattr"):
+            return _method
+        if (module, name) == ("diagnosis.snapshot", "_restore_fact"):
+            return _restore_fact
+        if module in _SAFE_MODULES or (module, name) in _SAFE_GLOBALS:
+            obj = super().find_class(module, name)
+            if isinstance(obj, type):
+                return obj
+        raise SnapshotError("snapshot refers to %s.%s, which a snapshot may not load" % (module, name))
+
+    def persistent_load(self, pid):
+        if pid == ("class",):
+            return self.engine_cls
+        try:
+            member = self.members[pid[1]]
+        except (KeyError, IndexError, TypeError):
+            raise SnapshotError("snapshot refers to %r, which %s does not define" % (
+                pid, self.engine_cls.__name__)) from None
+        if pid[0] != "rule":
+            return member
+        # Like the network experta builds: unbound copies of the class rules.
+        # Same result as ``member.new_conditions()`` without re-inspecting the body.
+        rule = self.copies.get(pid[1:])
+        if rule is None:
+            rule = self.copies[pid[1:]] = Rule.__new__(type(member), *pid[2], salience=member.salience)
+            vars(rule).update(vars(member), _wrapped_self=None)
+        return rule
+
+
+def _restore_fact(cls, items, state):
+    fact = cls.__new__(cls)
+    dict.update(fact, items)
+    vars(fact).update(state)
+    return fact
+
+
+@lru_cache(maxsize=None)
+def _fingerprint(engine_cls):
+    # Rule definitions do not change under a running process; the file may
+    return rules_fingerprint(engine_cls)
+
+
+def header_for(engine_cls=ComputerDiagnosis):
+    """Header a snapshot of ``engine_cls`` is written with and checked against"""
+    return {
+        "version": SNAPSHOT_VERSION,
+        "engine": _qualname(engine_cls),
+        "rules": _fingerprint(engine_cls),
+    }
+
+
+def save_snapshot(path, engine_cls=ComputerDiagnosis, engine=None):
+    """Write a snapshot of ``engine`` (a fresh, reset one by default)
+
+    The file is replaced atomically, so concurrent loaders see either the
+    old snapshot or the new one.
+    """
+    if engine is None:
+        engine = engine_cls()
+        engine.reset()
+    elif type(engine) is not engine_cls:
+        raise TypeError("engine is a %s, not a %s" % (type(engine).__name__, engine_cls.__name__))
+
+    header = json.dumps(header_for(engine_cls), sort_keys=True).encode()
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(MAGIC + _LENGTH.pack(len(header)) + header)
+            _Pickler(out, engine_cls).dump(engine)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return path
+
+
+def _read_header(view):
+    prefix = len(MAGIC) + _LENGTH.size
+    if len(view) < prefix or bytes(view[:len(MAGIC)]) != MAGIC:
+        raise SnapshotError("not a diagnosis snapshot")
+    length, = _LENGTH.unpack(view[len(MAGIC):prefix])
+    try:
+        header = json.loads(bytes(view[prefix:prefix + length]))
+    except ValueError:
+        raise SnapshotError("corrupt snapshot header") from None
+    return header, prefix + length
+
+
+def read_header(path):
+    """The JSON header of a snapshot file"""
+    with open(path, "rb") as handle:
+        return _read_header(handle.read(4096))[0]
+
+
+def load_snapshot(path, engine_cls=ComputerDiagnosis):
+    """Engine restored from ``path``, ready to ``declare()`` and ``run()``
+
+    Raises ``SnapshotError`` when the file is not a snapshot, was written
+    by another snapshot version or for other rule definitions.
+    """
+    with open(path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            header, offset = _read_header(view)
+            if header.get("version") != SNAPSHOT_VERSION:
+                raise SnapshotError("snapshot version %r, expected %d" % (header.get("version"), SNAPSHOT_VERSION))
+            expected = header_for(engine_cls)
+            if header.get("engine") != expected["engine"] or header.get("rules") != expected["rules"]:
+                raise SnapshotError("snapshot was taken for other rules than %s" % engine_cls.__name__)
+            payload = view[offset:]
+            try:
+                return _Unpickler(_Reader(payload), engine_cls).load()
+            except SnapshotError:
+                raise
+            except Exception as exc:
+                raise SnapshotError("corrupt snapshot: %s" % exc) from exc
+            finally:
+                payload.release()
+        finally:
+            view.release()
+
+
+class _Reader:
+    """File-like reads over a memoryview without copying it first"""
+
+    __slots__ = ("view", "position")
+
+    def __init__(self, view):
+        self.view = view
+        self.position = 0
+
+    def read(self, size=-1):
+        start = self.position
+        end = len(self.view) if size < 0 else min(start + size, len(self.view))
+        self.position = end
+        return self.view[start:end].tobytes()
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readline(self):
+        start = self.position
+        end = start
+        while end < len(self.view) and self.view[end] != 0x0A:
+            end += 1
+        return self.read(end + 1 - start)
+
+    def peek(self, size=1):
+        return self.view[self.position:self.position + max(size, 1)].tobytes()
+
+
+def load_or_build(path, engine_cls=ComputerDiagnosis):
+    """Restore from ``path``; on a missing or stale snapshot build and save one"""
+    try:
+        return load_snapshot(path, engine_cls)
+    except (OSError, SnapshotError):
+        pass
+    engine = engine_cls()
+    engine.reset()
+    try:
+        save_snapshot(path, engine_cls, engine)
+    except OSError:
+        pass  # a read-only location only costs the next start a rebuild
+    return engine
+
+
+def snapshot_factory(path, engine_cls=ComputerDiagnosis):
+    """Engine factory for ``EnginePool`` that restores engines from ``path``
+
+    A stale snapshot is rewritten by the first build, so later builds load it.
+    """
+    def factory():
+        return load_or_build(path, engine_cls)
+    return factory
+
+
+def _engine_class(kb_path):
+    if kb_path is None:
+        return ComputerDiagnosis
+    from .kbfile import build_engine, load_kb
+    from .knowledge import DiagnosisEngine
+    return build_engine(load_kb(kb_path), DiagnosisEngine)
+
+
+def _best(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Save, inspect or time engine snapshots")
+    parser.add_argument("command", choices=["save", "info", "bench"])
+    parser.add_argument("path")
+    parser.add_argument("--kb", default=None, help="knowledge-base file (default: the built-in rules)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        try:
+            print(json.dumps(read_header(args.path), indent=2, sort_keys=True))
+        except (OSError, SnapshotError) as exc:
+            print(exc, file=sys.stderr)
+            return 1
+        return 0
+
+    engine_cls = _engine_class(args.kb)
+    if args.command == "save":
+        save_snapshot(args.path, engine_cls)
+        print("%s: %d bytes" % (args.path, os.path.getsize(args.path)))
+        return 0
+
+    def build():
+        engine_cls().reset()
+
+    save_snapshot(args.path, engine_cls)
+    built = _best(build, args.repeat)
+    restored = _best(lambda: load_snapshot(args.path, engine_cls), args.repeat)
+    print("%s (%d rules): build+reset %.2f ms, restore %.2f ms (%.1fx), %d bytes" % (
+        engine_cls.__name__, len(engine_cls().get_rules()), built * 1000, restored * 1000,
+        built / restored, os.path.getsize(args.path)))
+    return 0
+
+
+if __name__ == "__main__":
+    # Under ``-m`` this module is ``__main__``; run the importable copy so
+    # ``_restore_fact`` is pickled as ``diagnosis.snapshot._restore_fact``
+    from diagnosis.snapshot import main
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""Startup-time budget for the headless import path.
+
+Run ``python -m diagnosis.startup`` to time ``import diagnosis`` plus one
+``diagnose()`` call in fresh interpreters and check them against the budget.
+"""
+import json
+import os
+import subprocess
+import sys
+
+# Budget for a cold ``import diagnosis`` + first diagnosis, in milliseconds
+STARTUP_BUDGET_MS = 250
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import diagnosis
+t1 = time.perf_counter()
+diagnosis.diagnose(["no_display"])
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "first_diagnose_ms": (t2 - t1) * 1000,
+    "tkinter_loaded": "tkinter" in sys.modules,
+}))
+"""
+
+
+def measure_startup(repeat=5):
+    """Time the headless import path in ``repeat`` fresh interpreters, keep the best"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE],
+            cwd=root, check=True, capture_output=True, text=True,
+        ).stdout
+        sample = json.loads(out.strip().splitlines()[-1])
+        sample["total_ms"] = sample["import_ms"] + sample["first_diagnose_ms"]
+        if best is None or sample["total_ms"] < best["total_ms"]:
+            best = sample
+    return best
+
+
+def check_startup(budget_ms=STARTUP_BUDGET_MS, repeat=5):
+    """Return ``(ok, sample)``; fails when over budget or when tkinter got imported"""
+    sample = measure_startup(repeat)
+    ok = sample["total_ms"] <= budget_ms and not sample["tkinter_loaded"]
+    return ok, sample
+
+
+if __name__ == "__main__":
+    ok, sample = check_startup()
+    print(json.dumps(dict(sample, budget_ms=STARTUP_BUDGET_MS, ok=ok), indent=2))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,517 @@
+"""Symptoms derived from machine telemetry instead of ticked boxes.
+
+A pipeline of generators, each stage pulling from the previous one:
+
+    lines = tail(paths, follow=True)         # raw log lines, read incrementally
+    readings = parse_lines(lines)            # Reading(time, host, metric, value)
+    for update in TelemetryMonitor().process(readings):
+        ...                                  # HostUpdate whenever a host changes
+
+Log lines are ``TIMESTAMP HOST ITEM...``. The timestamp is in epoch
+seconds or ISO 8601. An item is ``metric=value`` for sensor readings and
+SMART attributes, or a bare event name such as ``unexpected_shutdown``,
+which counts as ``event=1``::
+
+    1718000000 web-17 cpu_temp=91.5 fan_rpm=2400
+    1718000004 web-17 smart.spin_retry_count=3
+    2024-06-10T06:13:31 db-02 unexpected_shutdown
+
+Each ``Threshold`` compares an aggregate (``max``, ``min``, ``mean``,
+``sum``, ``count``, ``last`` or ``delta``) of one metric over a sliding
+time window with a limit. A symptom is present while any of its
+thresholds holds. Present symptoms are declared into the host's
+``LiveSession``, a long-lived engine, and retracted when the window
+slides past the readings that caused them.
+
+Memory stays bounded whatever the log volume:
+
+* windows keep ``BUCKETS`` fixed-width summary buckets, not the samples;
+* only metrics some threshold reads are stored;
+* at most ``max_engines`` hosts hold an engine; the least recently
+  changed one gives up its engine (cleared and reused) when another host
+  needs one, and gets it back from its symptom set;
+* hosts silent for ``host_ttl`` seconds of log time are forgotten; by
+  default that is the longest threshold window, after which every window
+  of the host is empty anyway;
+* at most ``max_hosts`` hosts are tracked; a new host beyond that makes
+  the least recently heard-from one be forgotten.
+
+With the default thresholds a host costs about 13 KB of windows and an
+engine about 185 KB. ``--simulate 2000`` runs at about 70,000 lines
+(two readings each) per second on one core.
+
+``python -m diagnosis.telemetry LOG... [--follow]`` prints updates as
+JSONL; ``--simulate HOSTS`` times the pipeline on generated logs.
+"""
+import argparse
+import json
+import operator
+import os
+import sys
+import time
+from collections import OrderedDict, deque, namedtuple
+from datetime import datetime
+
+from .knowledge import ComputerDiagnosis
+from .live import LiveSession
+
+Reading = namedtuple("Reading", ["time", "host", "metric", "value"])
+
+Threshold = namedtuple("Threshold", ["symptom", "metric", "aggregate", "window", "op", "limit"])
+
+# ``symptoms`` is every symptom present after the change, ``diagnoses``
+# what the host's engine concludes from them (see ``LiveSession.candidates``)
+HostUpdate = namedtuple("HostUpdate", ["time", "host", "symptoms", "diagnoses"])
+
+DEFAULT_THRESHOLDS = (
+    Threshold("high_cpu_temperature", "cpu_temp", "mean", 60, ">=", 85),
+    Threshold("overheating", "cpu_temp", "max", 300, ">=", 95),
+    Threshold("overheating", "gpu_temp", "max", 300, ">=", 95),
+    Threshold("fans_not_spinning", "fan_rpm", "max", 60, "<=", 0),
+    Threshold("high_fan_noise", "fan_rpm", "mean", 300, ">=", 4500),
+    Threshold("sudden_shutdown", "unexpected_shutdown", "count", 3600, ">=", 1),
+    Threshold("random_shutdowns", "unexpected_shutdown", "count", 86400, ">=", 3),
+    # Spin-up retries are what a clicking drive looks like in a SMART dump
+    Threshold("clicking_noise_from_hard_drive", "smart.spin_retry_count", "delta", 86400, ">", 0),
+    Threshold("hard_drive_failure", "smart.reallocated_sectors", "delta", 86400, ">=", 50),
+    Threshold("intermittent_connectivity", "link_down", "count", 600, ">=", 3),
+    Threshold("incorrect_system_clock", "clock_offset", "last", 3600, ">", 120),
+    Threshold("incorrect_system_clock", "clock_offset", "last", 3600, "<", -120),
+    Threshold("os_crashes", "kernel_panic", "count", 86400, ">=", 1),
+)
+
+BUCKETS = 12
+DEFAULT_MAX_ENGINES = 256
+DEFAULT_MAX_HOSTS = 10000
+DEFAULT_SWEEP_INTERVAL = 10.0
+READ_SIZE = 1 << 16
+MAX_LINE_BYTES = 1 << 16
+
+_OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "==": operator.eq}
+
+
+def load_thresholds(path):
+    """Thresholds from a JSON list of objects with ``Threshold`` fields"""
+    with open(path, encoding="utf-8") as handle:
+        items = json.load(handle)
+    thresholds = []
+    for number, item in enumerate(items):
+        try:
+            threshold = Threshold(**item)
+        except TypeError as exc:
+            raise ValueError("threshold %d: %s" % (number, exc)) from None
+        if threshold.op not in _OPS or threshold.aggregate not in _Window.AGGREGATES:
+            raise ValueError("threshold %d: unknown op or aggregate" % number)
+        thresholds.append(threshold)
+    return tuple(thresholds)
+
+
+# Stage 1: lines
+
+def tail(paths, follow=False, poll_interval=0.5, stop=None, from_end=False):
+    """Yield lines from every file in ``paths`` as they are written
+
+    Files are read in large blocks and only complete lines are yielded.
+    With ``follow`` the generator keeps polling like ``tail -F``: it
+    reopens a file that was rotated or truncated and picks up files that
+    appear later. It returns once ``stop()`` is true, or at the end of the
+    files without ``follow``.
+    """
+    files = {path: None for path in paths}  # path -> [handle, inode, partial]
+    first = True
+    while True:
+        progressed = False
+        for path, state in files.items():
+            if state is None:
+                try:
+                    handle = open(path, "rb")
+                except OSError:
+                    continue
+                if from_end and first:
+                    handle.seek(0, os.SEEK_END)
+                state = files[path] = [handle, os.fstat(handle.fileno()).st_ino, b""]
+            handle = state[0]
+            data = handle.read(READ_SIZE)
+            if data:
+                progressed = True
+                lines = (state[2] + data).split(b"\n")
+                state[2] = lines.pop()
+                if len(state[2]) > MAX_LINE_BYTES:
+                    state[2] = b""  # runaway line: drop it rather than grow without bound
+                for line in lines:
+                    yield line.decode("utf-8", "replace")
+            elif follow:
+                try:
+                    current = os.stat(path)
+                except OSError:
+                    current = None
+                if current is None or current.st_ino != state[1] or current.st_size < handle.tell():
+                    handle.close()
+                    files[path] = None
+                    progressed = True
+        first = False
+        if stop is not None and stop():
+            break
+        if not progressed:
+            if not follow:
+                break
+            time.sleep(poll_interval)
+    for state in files.values():
+        if state is not None:
+            if state[2] and not follow:
+                yield state[2].decode("utf-8", "replace")
+            state[0].close()
+
+
+# Stage 2: readings
+
+def _timestamp(text):
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+
+
+def parse_lines(lines, errors=None):
+    """Yield a ``Reading`` per item of every well-formed line
+
+    Malformed lines are skipped; when ``errors`` is a list they are
+    appended to it (keep it bounded by draining it).
+    """
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 3:
+            if parts and errors is not None:
+                errors.append(line)
+            continue
+        try:
+            when = _timestamp(parts[0])
+            host = parts[1]
+            items = []
+            for item in parts[2:]:
+                metric, sep, value = item.partition("=")
+                items.append((metric, float(value) if sep else 1.0))
+        except ValueError:
+            if errors is not None:
+                errors.append(line)
+            continue
+        for metric, value in items:
+            yield Reading(when, host, metric, value)
+
+
+# Stage 3: windows, thresholds and engines
+
+class _Window:
+    """Summary of one metric over a sliding time window, in fixed buckets
+
+    Each bucket is ``[index, count, total, low, high, first, last]``.
+    """
+
+    __slots__ = ("width", "buckets")
+
+    AGGREGATES = ("max", "min", "mean", "sum", "count", "last", "delta")
+
+    def __init__(self, seconds):
+        self.width = seconds / BUCKETS
+        self.buckets = deque()
+
+    def add(self, when, value):
+        index = int(when // self.width)
+        buckets = self.buckets
+        if buckets and buckets[-1][0] == index:
+            bucket = buckets[-1]
+            bucket[1] += 1
+            bucket[2] += value
+            if value < bucket[3]:
+                bucket[3] = value
+            if value > bucket[4]:
+                bucket[4] = value
+            bucket[6] = value
+        elif not buckets or buckets[-1][0] < index:
+            buckets.append([index, 1, value, value, value, value, value])
+        else:
+            # Late reading: fold it into its bucket if that is still kept
+            for bucket in buckets:
+                if bucket[0] == index:
+                    bucket[1] += 1
+                    bucket[2] += value
+                    bucket[3] = min(bucket[3], value)
+                    bucket[4] = max(bucket[4], value)
+                    break
+
+    def expire(self, now):
+        oldest = int(now // self.width) - BUCKETS
+        buckets = self.buckets
+        while buckets and buckets[0][0] <= oldest:
+            buckets.popleft()
+
+    def aggregate(self, kind):
+        buckets = self.buckets
+        if not buckets:
+            return None
+        if kind == "count":
+            return sum(bucket[1] for bucket in buckets)
+        if kind == "max":
+            return max(bucket[4] for bucket in buckets)
+        if kind == "min":
+            return min(bucket[3] for bucket in buckets)
+        if kind == "last":
+            return buckets[-1][6]
+        if kind == "delta":
+            return buckets[-1][6] - buckets[0][5]
+        total = sum(bucket[2] for bucket in buckets)
+        if kind == "sum":
+            return total
+        return total / sum(bucket[1] for bucket in buckets)
+
+
+class _Host:
+    __slots__ = ("windows", "holding", "symptoms", "seen")
+
+    def __init__(self):
+        self.windows = {}
+        self.holding = set()  # indices of the thresholds that hold
+        self.symptoms = {}    # symptom -> number of its thresholds that hold
+        self.seen = 0.0
+
+
+class TelemetryMonitor:
+    """Turns readings into symptom facts on one long-lived engine per host"""
+
+    def __init__(self, thresholds=DEFAULT_THRESHOLDS, engine_cls=ComputerDiagnosis,
+                 max_engines=DEFAULT_MAX_ENGINES, host_ttl=None, sweep_interval=DEFAULT_SWEEP_INTERVAL,
+                 max_hosts=DEFAULT_MAX_HOSTS):
+        if max_engines < 1:
+            raise ValueError("max_engines must be at least 1")
+        if max_hosts < 1:
+            raise ValueError("max_hosts must be at least 1")
+        self.thresholds = tuple(thresholds)
+        self.engine_cls = engine_cls
+        self.max_engines = max_engines
+        self.max_hosts = max_hosts
+        if host_ttl is None:
+            host_ttl = max((threshold.window for threshold in self.thresholds), default=0)
+        self.host_ttl = host_ttl
+        self.sweep_interval = sweep_interval
+        self.hosts = OrderedDict()  # host -> _Host, least recently heard from first
+        self.sessions = OrderedDict()  # host -> LiveSession, least recently changed first
+        self.clock = float("-inf")
+        self._next_sweep = None
+        # metric -> [(window key, [(threshold index, aggregate, op, limit)])]
+        self._by_metric = {}
+        for number, threshold in enumerate(self.thresholds):
+            if threshold.aggregate not in _Window.AGGREGATES:
+                raise ValueError("unknown aggregate %r" % (threshold.aggregate,))
+            groups = self._by_metric.setdefault(threshold.metric, [])
+            key = (threshold.metric, threshold.window)
+            for group_key, checks in groups:
+                if group_key == key:
+                    break
+            else:
+                checks = []
+                groups.append((key, checks))
+            checks.append((number, threshold.aggregate, _OPS[threshold.op], threshold.limit))
+        self._stats = {"readings": 0, "ignored": 0, "changes": 0, "engine_builds": 0, "engine_evictions": 0,
+                       "hosts_expired": 0, "hosts_evicted": 0}
+
+    def process(self, readings):
+        """Yield a ``HostUpdate`` each time a host's symptom set changes"""
+        by_metric = self._by_metric
+        hosts = self.hosts
+        stats = self._stats
+        for reading in readings:
+            stats["readings"] += 1
+            groups = by_metric.get(reading.metric)
+            if groups is None:
+                stats["ignored"] += 1
+                continue
+            now = reading.time
+            host = hosts.get(reading.host)
+            if host is None:
+                if len(hosts) >= self.max_hosts:
+                    self.forget(next(iter(hosts)))
+                    stats["hosts_evicted"] += 1
+                host = hosts[reading.host] = _Host()
+            else:
+                hosts.move_to_end(reading.host)
+            host.seen = now
+            changed = False
+            for key, checks in groups:
+                window = host.windows.get(key)
+                if window is None:
+                    window = host.windows[key] = _Window(key[1])
+                window.expire(now)
+                window.add(now, reading.value)
+                changed |= self._evaluate(host, window, checks)
+            if changed:
+                # Windows of other metrics may have slid past their symptoms
+                # since the last sweep; the update must not report those
+                self._slide(host, now)
+                yield self._update(now, reading.host, host)
+
+            if now > self.clock:
+                self.clock = now
+                if self._next_sweep is None:
+                    self._next_sweep = now + self.sweep_interval
+                elif now >= self._next_sweep:
+                    self._next_sweep = now + self.sweep_interval
+                    yield from self.sweep(now)
+
+    def _evaluate(self, host, window, checks):
+        changed = False
+        holding = host.holding
+        for number, aggregate, compare, limit in checks:
+            value = window.aggregate(aggregate)
+            holds = value is not None and compare(value, limit)
+            if holds == (number in holding):
+                continue
+            symptom = self.thresholds[number].symptom
+            if holds:
+                holding.add(number)
+                count = host.symptoms.get(symptom, 0)
+                host.symptoms[symptom] = count + 1
+                changed |= count == 0
+            else:
+                holding.discard(number)
+                count = host.symptoms.pop(symptom) - 1
+                if count:
+                    host.symptoms[symptom] = count
+                changed |= count == 0
+        return changed
+
+    def sweep(self, now=None):
+        """Let windows of present symptoms slide to ``now``; forget idle hosts
+
+        Runs on its own every ``sweep_interval`` seconds of log time.
+        Yields the resulting updates.
+        """
+        now = self.clock if now is None else now
+        for name, host in list(self.hosts.items()):
+            if now - host.seen > self.host_ttl:
+                self.forget(name)
+                self._stats["hosts_expired"] += 1
+                continue
+            if host.holding and self._slide(host, now):
+                yield self._update(now, name, host)
+
+    def _slide(self, host, now):
+        """Expire the windows of the host's present symptoms; True if a symptom went"""
+        changed = False
+        for metric in {self.thresholds[number].metric for number in host.holding}:
+            for key, checks in self._by_metric[metric]:
+                window = host.windows.get(key)
+                if window is not None:
+                    window.expire(now)
+                    changed |= self._evaluate(host, window, checks)
+        return changed
+
+    def _session(self, name):
+        session = self.sessions.get(name)
+        if session is not None:
+            self.sessions.move_to_end(name)
+            return session
+        if len(self.sessions) >= self.max_engines:
+            # Hand the least recently changed host's engine over
+            _, session = self.sessions.popitem(last=False)
+            session.clear()
+            self._stats["engine_evictions"] += 1
+        else:
+            session = LiveSession(self.engine_cls)
+            self._stats["engine_builds"] += 1
+        self.sessions[name] = session
+        return session
+
+    def _update(self, now, name, host):
+        self._stats["changes"] += 1
+        present = frozenset(host.symptoms)
+        return HostUpdate(now, name, present, self._sync(name, present))
+
+    def _sync(self, name, present):
+        """Bring the host's engine to ``present`` and read its conclusions"""
+        if not present and name not in self.sessions:
+            return ()
+        session = self._session(name)
+        for symptom in session.symptoms - present:
+            session.set(symptom, False)
+        for symptom in present - session.symptoms:
+            session.set(symptom, True)
+        return tuple(candidate.diagnosis for candidate in session.candidates())
+
+    def symptoms(self, name):
+        host = self.hosts.get(name)
+        return frozenset(host.symptoms) if host is not None else frozenset()
+
+    def diagnoses(self, name):
+        """What the host's engine currently concludes"""
+        symptoms = self.symptoms(name)
+        return self._sync(name, symptoms) if symptoms else ()
+
+    def forget(self, name):
+        self.hosts.pop(name, None)
+        session = self.sessions.pop(name, None)
+        if session is not None:
+            session.clear()
+
+    def stats(self):
+        return dict(self._stats, hosts=len(self.hosts), engines=len(self.sessions))
+
+
+def simulate(hosts, seconds, interval=10.0, seed=0):
+    """Synthetic log lines for ``hosts`` hosts over ``seconds`` of log time"""
+    import random
+
+    rng = random.Random(seed)
+    names = ["host-%05d" % number for number in range(hosts)]
+    hot = set(rng.sample(names, max(1, hosts // 50)))
+    flaky = set(rng.sample(names, max(1, hosts // 100)))
+    start = 1718000000
+    for step in range(int(seconds // interval)):
+        when = start + step * interval
+        for name in names:
+            temp = rng.gauss(92 if name in hot else 55, 3)
+            yield "%d %s cpu_temp=%.1f fan_rpm=%d" % (when, name, temp, rng.gauss(2200, 200))
+            if name in flaky and rng.random() < 0.2:
+                yield "%d %s link_down" % (when, name)
+            if rng.random() < 0.0005:
+                yield "%d %s unexpected_shutdown" % (when, name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Derive symptoms from machine logs and diagnose each host")
+    parser.add_argument("logs", nargs="*", help="log files ('TIMESTAMP HOST metric=value|event ...' lines)")
+    parser.add_argument("--follow", action="store_true", help="keep reading as the logs grow")
+    parser.add_argument("--thresholds", help="JSON threshold list (default: the built-in table)")
+    parser.add_argument("--max-engines", type=int, default=DEFAULT_MAX_ENGINES)
+    parser.add_argument("--host-ttl", type=float, default=None,
+                        help="forget hosts silent this long (log seconds; default: the longest threshold window)")
+    parser.add_argument("--max-hosts", type=int, default=DEFAULT_MAX_HOSTS)
+    parser.add_argument("--simulate", type=int, metavar="HOSTS", help="time the pipeline on generated logs")
+    parser.add_argument("--seconds", type=float, default=3600, help="with --simulate: log time to generate")
+    args = parser.parse_args(argv)
+
+    thresholds = load_thresholds(args.thresholds) if args.thresholds else DEFAULT_THRESHOLDS
+    monitor = TelemetryMonitor(thresholds, max_engines=args.max_engines, host_ttl=args.host_ttl,
+                               max_hosts=args.max_hosts)
+
+    if args.simulate:
+        lines = list(simulate(args.simulate, args.seconds))
+        started = time.perf_counter()
+        updates = sum(1 for _ in monitor.process(parse_lines(lines)))
+        elapsed = time.perf_counter() - started
+        print(json.dumps(dict(monitor.stats(), updates=updates, lines=len(lines), elapsed_seconds=elapsed,
+                              lines_per_second=len(lines) / elapsed), indent=2))
+        return 0
+
+    if not args.logs:
+        parser.error("give log files or --simulate")
+    try:
+        for update in monitor.process(parse_lines(tail(args.logs, follow=args.follow))):
+            print(json.dumps({"time": update.time, "host": update.host, "symptoms": sorted(update.symptoms),
+                              "diagnoses": list(update.diagnoses)}), flush=True)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,382 @@
+"""Static checks of a knowledge base over its whole symptom space.
+
+Every rule is flattened into disjunctive normal form over symptoms only:
+a pattern on a fact other rules declare is replaced by the terms of its
+producers, iterated to a fixpoint so chains and cycles resolve the way
+forward chaining would. A term is a pair of bitmasks (symptoms required,
+symptoms forbidden) and the rule fires for a symptom set exactly when
+one of its terms holds.
+
+The verifier then reports:
+
+* ``unreachable`` -- rules no symptom set can fire, with the reason (a
+  pattern no rule declares, contradictory conditions, only unreachable
+  producers), and rules that need a symptom missing from the catalog;
+* ``dead-symptom`` -- rule symptoms missing from the catalog, catalog
+  symptoms no rule reads (or only unreachable rules read) and names that
+  only differ in case or punctuation;
+* ``subsumed`` -- rules whose conclusion another rule already reaches
+  whenever they fire, and ``shadowed`` rules that always fire together
+  with a higher-salience rule;
+* ``conflict`` -- rules firing on exactly the same evidence with different
+  diagnoses, and one diagnosis given different recommendations.
+
+Rules on numeric readings (``{"reading": ...}`` conditions) are outside
+the symptom space: their reading branches are left out, and they are
+never reported unreachable or covered by another rule because of it.
+
+Implications between rules are decided by enumerating every combination
+of the symptoms the two rules can see (nothing else affects either), after
+a cheap filter: ``A`` can only imply ``B`` if ``B`` fires on each of ``A``'s
+minimal witnesses. The per-rule work is sharded over a process pool.
+
+    python -m diagnosis.verify [knowledge-base.json] [--workers N] [--json]
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from experta import Rule
+
+from .catalog import SYMPTOM_NAMES
+from .compiled import CompiledEvaluator, _class_members, _content, _literals, _matches
+from .kbfile import name_key
+from .knowledge import ComputerDiagnosis
+
+# Rules seeing more symptoms than this are not enumerated (2**n combinations)
+MAX_RELEVANT = 16
+
+# A rule whose flattened form grows past this many terms is left out of the implication checks
+MAX_TERMS = 4096
+
+# Below this many rules the checks run in-process
+MIN_PARALLEL_RULES = 256
+
+Finding = namedtuple("Finding", ["check", "subject", "detail"])
+
+
+def _absorb(terms):
+    """Drop contradictory terms and those implied by a weaker one"""
+    terms = sorted({(pos, neg) for pos, neg in terms if not pos & neg},
+                   key=lambda term: (bin(term[0]).count("1") + bin(term[1]).count("1"), term))
+    kept = []
+    for pos, neg in terms:
+        if not any(p & pos == p and n & neg == n for p, n in kept):
+            kept.append((pos, neg))
+    return tuple(kept)
+
+
+def flatten(evaluator, max_terms=MAX_TERMS):
+    """Per rule, its DNF over symptoms as a tuple of ``(pos, neg)`` masks
+
+    Returns ``(terms, overflow)``; ``overflow`` holds the indices of rules
+    whose form outgrew ``max_terms`` (their terms are then incomplete).
+    """
+    terms = [() for _ in evaluator.rules]
+    overflow = set()
+    changed = True
+    while changed:
+        changed = False
+        for rule in evaluator.rules:
+            found = []
+            for branch in rule.branches:
+                partial = [(branch.pos, branch.neg)]
+                for producers in branch.derived:
+                    options = [term for producer in producers for term in terms[producer]]
+                    partial = [(pos | p, neg | n) for pos, neg in partial for p, n in options]
+                    if len(partial) > max_terms:
+                        partial = partial[:max_terms]
+                        overflow.add(rule.index)
+                found.extend(partial)
+            found = _absorb(found)[:max_terms]
+            if found != terms[rule.index]:
+                terms[rule.index] = found
+                changed = True
+    return terms, overflow
+
+
+def _fires(terms, mask):
+    for pos, neg in terms:
+        if pos & mask == pos and not neg & mask:
+            return True
+    return False
+
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low
+        mask ^= low
+
+
+def _implies(terms_a, terms_b, seen):
+    """Whether ``A`` firing implies ``B`` firing, over every combination of ``seen``"""
+    masks = [0]
+    for bit in _bits(seen):
+        masks += [mask | bit for mask in masks]
+    for mask in masks:
+        if _fires(terms_a, mask) and not _fires(terms_b, mask):
+            return False
+    return True
+
+
+# Worker side: the flattened knowledge base, sent once per process
+_terms = None
+_by_bit = None
+
+
+def _init_worker(terms):
+    global _terms, _by_bit
+    _terms = terms
+    # Lowest required symptom bit (0 for none) -> [(rule, pos, neg)], to find
+    # the rules that can fire on a given symptom set without scanning them all
+    _by_bit = {}
+    for rule, rule_terms in enumerate(terms):
+        for pos, neg in rule_terms:
+            _by_bit.setdefault(pos & -pos, []).append((rule, pos, neg))
+
+
+def _firing_on(mask):
+    rules = set()
+    for bit in itertools.chain((0,), _bits(mask)):
+        for rule, pos, neg in _by_bit.get(bit, ()):
+            if pos & mask == pos and not neg & mask:
+                rules.add(rule)
+    return rules
+
+
+def _seen(terms):
+    seen = 0
+    for pos, neg in terms:
+        seen |= pos | neg
+    return seen
+
+
+def _check_shard(rules, max_relevant=MAX_RELEVANT):
+    """``(rule, implied rules, enumerated combinations)`` for each rule, or ``None`` when skipped"""
+    results = []
+    for rule in rules:
+        terms = _terms[rule]
+        seen = _seen(terms)
+        if not terms or bin(seen).count("1") > max_relevant:
+            results.append((rule, None, 0))
+            continue
+        # A's minimal witnesses are its required symptoms with nothing else present
+        candidates = None
+        for pos, _ in terms:
+            firing = _firing_on(pos)
+            candidates = firing if candidates is None else candidates & firing
+        candidates.discard(rule)
+
+        implied = []
+        enumerated = 0
+        for other in sorted(candidates):
+            union = seen | _seen(_terms[other])
+            if bin(union).count("1") > max_relevant:
+                continue
+            enumerated += 1 << bin(union).count("1")
+            if _implies(terms, _terms[other], union):
+                implied.append(other)
+        results.append((rule, implied, enumerated))
+    return results
+
+
+def _shards(count, workers):
+    size = max(1, -(-count // (workers * 4)))
+    return [range(start, min(count, start + size)) for start in range(0, count, size)]
+
+
+def verify(engine_cls=ComputerDiagnosis, symptoms=SYMPTOM_NAMES, workers=None, max_relevant=MAX_RELEVANT):
+    """Check ``engine_cls`` against the ``symptoms`` catalog; returns ``(findings, stats)``"""
+    started = time.perf_counter()
+    evaluator = CompiledEvaluator(engine_cls, symptoms)
+    rules = evaluator.rules
+    catalog = set(symptoms)
+    catalog_mask = evaluator.encode(catalog)
+    terms, overflow = flatten(evaluator)
+    findings = []
+
+    # Unreachable rules
+    unreachable = set()
+    for rule in rules:
+        if not terms[rule.index] and rule.index in evaluator.reading_rules:
+            continue
+        if not terms[rule.index] and rule.index not in overflow:
+            unreachable.add(rule.index)
+            findings.append(Finding("unreachable", rule.name, _why_unreachable(evaluator, rule, terms)))
+        elif terms[rule.index] and all(pos & ~catalog_mask for pos, _ in terms[rule.index]):
+            needed = sorted({evaluator.symptoms[bit.bit_length() - 1]
+                             for pos, _ in terms[rule.index] for bit in _bits(pos & ~catalog_mask)})
+            findings.append(Finding(
+                "unreachable", rule.name, "needs symptoms missing from the catalog: %s" % ", ".join(needed)))
+
+    # Dead symptoms
+    readers = {}
+    for index, (_, engine_rule) in enumerate(sorted(_class_members(engine_cls, Rule), key=lambda item: item[0])):
+        for literals in _literals(engine_rule):
+            for _, pattern in literals:
+                content = dict(_content(pattern))
+                if list(content) == ["symptom"]:
+                    readers.setdefault(content["symptom"], set()).add(index)
+    for symptom in evaluator.symptoms:
+        users = readers.get(symptom, set())
+        if symptom not in catalog:
+            findings.append(Finding("dead-symptom", symptom, "read by %s but missing from the catalog"
+                                    % ", ".join(sorted(rules[index].name for index in users))))
+        elif not users:
+            findings.append(Finding("dead-symptom", symptom, "no rule reads it"))
+        elif users <= unreachable:
+            findings.append(Finding("dead-symptom", symptom, "only read by unreachable rules: %s"
+                                    % ", ".join(sorted(rules[index].name for index in users))))
+    spellings = {}
+    for symptom in evaluator.symptoms:
+        spellings.setdefault(name_key(symptom), []).append(symptom)
+    for names in spellings.values():
+        if len(names) > 1:
+            findings.append(Finding("dead-symptom", names[0], "spelled differently elsewhere: %s"
+                                    % ", ".join(names[1:])))
+
+    # Implications between rules
+    # A rule that also fires on readings implies nothing from its symptom terms alone
+    checked = [index for index in range(len(rules)) if index not in overflow and index not in evaluator.reading_rules]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(rules) < MIN_PARALLEL_RULES:
+        _init_worker(terms)
+        shards = [_check_shard(checked, max_relevant)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(terms,)) as executor:
+            parts = [[checked[i] for i in shard] for shard in _shards(len(checked), workers)]
+            shards = list(executor.map(_check_shard, parts, itertools.repeat(max_relevant)))
+
+    implied = {}
+    skipped = set(overflow)
+    enumerated = 0
+    for shard in shards:
+        for index, others, count in shard:
+            enumerated += count
+            if others is None:
+                if index not in unreachable:
+                    skipped.add(index)
+            else:
+                implied[index] = set(others)
+
+    for index, others in sorted(implied.items()):
+        rule = rules[index]
+        for other in sorted(others):
+            peer = rules[other]
+            equivalent = index in implied.get(other, ())
+            if equivalent and other < index:
+                continue  # reported once, from the first rule of the pair
+            same = set(rule.produces) == set(peer.produces)
+            if same:
+                findings.append(Finding("subsumed", rule.name, "%s fires %s and concludes the same"
+                                        % (peer.name, "on the same evidence" if equivalent else "whenever it does")))
+            elif equivalent and _diagnoses(rule) != _diagnoses(peer):
+                findings.append(Finding("conflict", rule.name, "%s fires on the same evidence but concludes %s"
+                                        % (peer.name, ", ".join(sorted(_diagnoses(peer))) or "no diagnosis")))
+            elif peer.salience > rule.salience:
+                findings.append(Finding("shadowed", rule.name, "always fires with %s, which has higher salience"
+                                        % peer.name))
+
+    # One diagnosis, several recommendations
+    recommendations = {}
+    for rule in rules:
+        for content in rule.produces:
+            fact = dict(content)
+            if "diagnosis" in fact:
+                recommendations.setdefault(fact["diagnosis"], {}).setdefault(
+                    fact.get("recommendation"), []).append(rule.name)
+    for diagnosis, given in sorted(recommendations.items()):
+        if len(given) > 1:
+            findings.append(Finding("conflict", diagnosis, "recommended differently by %s" % "; ".join(
+                "%s (%r)" % (", ".join(names), text) for text, names in given.items())))
+
+    for index in sorted(skipped):
+        findings.append(Finding("skipped", rules[index].name, "too many symptoms or terms to enumerate"))
+
+    stats = {
+        "rules": len(rules),
+        "symptoms": len(evaluator.symptoms),
+        "reading_rules": len(evaluator.reading_rules),
+        "terms": sum(len(rule_terms) for rule_terms in terms),
+        "combinations": enumerated,
+        "workers": workers if len(rules) >= MIN_PARALLEL_RULES else 1,
+        "seconds": time.perf_counter() - started,
+    }
+    return findings, stats
+
+
+def _diagnoses(rule):
+    return {dict(content)["diagnosis"] for content in rule.produces if "diagnosis" in dict(content)}
+
+
+def _why_unreachable(evaluator, rule, terms):
+    """Explain why ``rule`` has no satisfiable term"""
+    engine_rule = dict(_class_members(evaluator.engine_cls, Rule))[rule.name]
+    produced = [fact for compiled in evaluator.rules for fact in compiled.produces]
+    reasons = []
+    for literals in _literals(engine_rule):
+        for negated, pattern in literals:
+            content = _content(pattern)
+            declared = (any(_matches(content, fact) for fact in evaluator.initial_facts)
+                        or any(_matches(content, fact) for fact in produced))
+            symptom = len(content) == 1 and next(iter(content))[0] == "symptom"
+            if negated or declared or symptom:
+                continue
+            text = ", ".join("%s=%r" % item for item in sorted(content))
+            near = sorted({
+                "%s=%r" % (key, value)
+                for fact in produced for key, value in fact
+                for want_key, want in content
+                if key == want_key and value != want and name_key(value) == name_key(want)
+            })
+            reasons.append("no rule declares %s%s" % (
+                text, " (did you mean %s?)" % " or ".join(near) if near else ""))
+    if reasons:
+        return "; ".join(sorted(set(reasons)))
+    feeders = {producer for branch in rule.branches for producers in branch.derived for producer in producers}
+    if feeders and not any(terms[producer] for producer in feeders):
+        return "only fed by unreachable rules: %s" % ", ".join(
+            sorted(evaluator.rules[producer].name for producer in feeders))
+    return "its conditions contradict each other"
+
+
+def format_findings(findings, stats):
+    lines = ["%-13s %-32s %s" % finding for finding in findings]
+    lines.append("%d rules, %d symptoms, %d combinations enumerated in %.2fs: %d findings" % (
+        stats["rules"], stats["symptoms"], stats["combinations"], stats["seconds"], len(findings)))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a knowledge base for unreachable and redundant rules")
+    parser.add_argument("kb", nargs="?", help="knowledge base file (default: the shipped one)")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--max-relevant", type=int, default=MAX_RELEVANT,
+                        help="skip rules seeing more symptoms than this")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    engine_cls, symptoms = ComputerDiagnosis, SYMPTOM_NAMES
+    if args.kb:
+        from .kbfile import build_engine, load_kb
+        from .knowledge import DiagnosisEngine
+        kb = load_kb(args.kb)
+        engine_cls = build_engine(kb, DiagnosisEngine)
+        symptoms = [name for _, name in kb.symptoms]
+
+    findings, stats = verify(engine_cls, symptoms, workers=args.workers, max_relevant=args.max_relevant)
+    if args.json:
+        print(json.dumps({"findings": [finding._asdict() for finding in findings], "stats": stats}, indent=2))
+    else:
+        print(format_findings(findings, stats))
+    return 1 if findings else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
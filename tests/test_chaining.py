@@ -0,0 +1,28 @@
+import random
+
+from diagnosis.chaining import ChainingEvaluator, chain_engine
+from diagnosis.compiled import compile_rules
+from diagnosis.core import diagnose
+from diagnosis.pool import EnginePool
+
+
+def test_unlinked_chaining_matches_experta():
+    unlinked = ChainingEvaluator(link=False)
+    names = list(compile_rules().symptoms)
+    rng = random.Random(0)
+    cases = [[], names] + [[name] for name in names]
+    cases += [rng.sample(names, rng.randint(0, len(names))) for _ in range(300)]
+    for case in cases:
+        expected = {entry.diagnosis for entry in diagnose(case)}
+        assert {entry.diagnosis for entry in unlinked.diagnose(case)} == expected, case
+
+
+def test_derived_chains_match_experta():
+    engine_cls = chain_engine(20, 3)
+    evaluator = ChainingEvaluator(engine_cls)
+    pool = EnginePool(engine_cls, size=1)
+    names = list(compile_rules(engine_cls).symptoms)
+    rng = random.Random(0)
+    for case in [[], names] + [rng.sample(names, rng.randint(0, len(names))) for _ in range(50)]:
+        expected = {entry.diagnosis for entry in diagnose(case, pool=pool)}
+        assert {entry.diagnosis for entry in evaluator.diagnose(case)} == expected, case
@@ -0,0 +1,7 @@
+from diagnosis.compiled import check_equivalence, compile_rules
+
+
+def test_compiled_evaluator_matches_experta():
+    # Empty set, singles, pairs, the whole catalog and 300 seeded random subsets
+    mismatches = check_equivalence(compile_rules(), samples=300, seed=0)
+    assert mismatches == [], mismatches[:5]
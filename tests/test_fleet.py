@@ -0,0 +1,30 @@
+import random
+from collections import Counter
+
+from diagnosis.catalog import SYMPTOM_NAMES
+from diagnosis.core import diagnose
+from diagnosis.fleet import fleet_report
+
+
+def test_report_matches_per_machine_diagnosis():
+    rng = random.Random(0)
+    vectors = [rng.sample(SYMPTOM_NAMES, rng.randint(0, 4)) for _ in range(40)]
+    machines = [("m%d" % number, rng.sample(vector, len(vector)))
+                for number, vector in enumerate(rng.choices(vectors, k=2000))]
+    groups = []
+    report = fleet_report(machines, top=5, on_result=lambda key, ids, result: groups.append(key))
+
+    histogram = Counter()
+    recommendations = {}
+    for machine_id, symptoms in machines:
+        result = diagnose(symptoms)
+        histogram.update({entry.diagnosis for entry in result})
+        for recommendation in {entry.recommendation for entry in result}:
+            recommendations.setdefault(recommendation, set()).add(machine_id)
+
+    assert report["machines"] == len(machines)
+    assert report["symptom_sets"] == len(groups) == len({frozenset(vector) for vector in vectors})
+    assert report["diagnoses"] == dict(histogram)
+    assert {key: set(ids) for key, ids in report["recommendations"].items()} == recommendations
+    counts = Counter(frozenset(symptoms) for _, symptoms in machines if len(set(symptoms)) > 1)
+    assert [pattern["machines"] for pattern in report["patterns"]] == sorted(counts.values(), reverse=True)[:5]
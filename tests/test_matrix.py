@@ -0,0 +1,44 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from diagnosis.catalog import SYMPTOM_NAMES  # noqa: E402
+from diagnosis.compiled import compile_rules  # noqa: E402
+from diagnosis.core import diagnose  # noqa: E402
+from diagnosis.matrix import MatrixScorer, diagnose_matrix, write_packed  # noqa: E402
+
+
+def _cases(count=300, seed=0):
+    rng = random.Random(seed)
+    names = list(SYMPTOM_NAMES)
+    return [[], names] + [rng.sample(names, rng.randint(0, 8)) for _ in range(count)]
+
+
+def _matrix(cases):
+    return np.array([[name in case for name in SYMPTOM_NAMES] for case in cases], dtype=bool)
+
+
+def test_fire_matrix_matches_scalar_diagnose():
+    evaluator = compile_rules()
+    cases = _cases()
+    fired = evaluator.fire_matrix(_matrix(cases))
+    for row, case in zip(fired, cases):
+        expected = {entry.rule for entry in diagnose(case)}
+        assert {evaluator.rules[index].name for index in np.flatnonzero(row)} == expected, case
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_diagnose_matrix_matches_scalar_diagnose(tmp_path, packed):
+    cases = _cases(200, seed=1)
+    source = str(tmp_path / ("cases.bin" if packed else "cases.npy"))
+    if packed:
+        write_packed(source, _matrix(cases), chunk_rows=64)
+    else:
+        np.save(source, _matrix(cases))
+    output = str(tmp_path / "codes.npy")
+    diagnose_matrix(source, output, chunk_rows=64)
+    scorer = MatrixScorer()
+    for row, case in zip(np.load(output), cases):
+        assert set(scorer.decode(row)) == {entry.diagnosis for entry in diagnose(case)}, case
@@ -0,0 +1,15 @@
+import pytest
+
+from diagnosis import diagnose
+from diagnosis.ranges import Range
+
+
+@pytest.mark.parametrize("value", ["hot", None, True, float("nan"), [90]])
+def test_non_numeric_reading_matches_no_range(value):
+    # The indexed path must agree with the plain P(Range) test
+    assert not Range(90, None)(value)
+    assert list(diagnose([], readings={"cpu_temp": value})) == []
+
+
+def test_numeric_reading_still_matches():
+    assert [entry.rule for entry in diagnose([], readings={"cpu_temp": 95})] == ["cpu_temperature_critical"]
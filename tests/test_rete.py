@@ -0,0 +1,42 @@
+import random
+
+from experta import Fact
+from experta.matchers.rete import ReteMatcher
+
+from diagnosis.catalog import SYMPTOM_NAMES
+from diagnosis.knowledge import ComputerDiagnosis
+
+PlainDiagnosis = type("PlainDiagnosis", (ComputerDiagnosis,), {"__matcher__": ReteMatcher})
+
+
+def _run(engine, symptoms, readings=()):
+    engine.reset()
+    for symptom in symptoms:
+        engine.declare(Fact(symptom=symptom))
+    for metric, value in readings:
+        engine.declare(Fact(**{metric: value}))
+    engine.run()
+    return engine.result()
+
+
+def test_indexed_matcher_fires_like_experta():
+    # Same diagnoses, rules and firing order, so agenda tie-breaks are unchanged
+    indexed, plain = ComputerDiagnosis(), PlainDiagnosis()
+    rng = random.Random(0)
+    names = list(SYMPTOM_NAMES)
+    cases = [([], ()), (names, ()), (names[::-1], ())]
+    for _ in range(300):
+        readings = [(metric, rng.choice([-200, 0, 65, 75, 92, 150]))
+                    for metric in rng.sample(["cpu_temp", "fan_rpm", "clock_offset"], rng.randint(0, 3))]
+        cases.append((rng.sample(names, rng.randint(0, 8)), readings))
+    for symptoms, readings in cases:
+        assert _run(indexed, symptoms, readings) == _run(plain, symptoms, readings), (symptoms, readings)
+
+
+def test_retraction_reaches_the_indexed_rules():
+    engine = ComputerDiagnosis()
+    engine.reset()
+    fact = engine.declare(Fact(symptom="no_display"))
+    engine.retract(fact)
+    engine.run()
+    assert list(engine.result()) == []
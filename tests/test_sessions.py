@@ -0,0 +1,19 @@
+import random
+
+from diagnosis.cache import canonical_order
+from diagnosis.catalog import SYMPTOM_NAMES
+from diagnosis.core import diagnose
+from diagnosis.sessions import SessionStore
+
+
+def test_sessions_diagnose_like_the_engine_and_share_results():
+    store = SessionStore()
+    rng = random.Random(0)
+    cases = [rng.sample(SYMPTOM_NAMES, rng.randint(0, 6)) for _ in range(100)]
+    for case in cases:
+        assert store.diagnose(store.create(case)) == diagnose(canonical_order(case)), case
+
+    first, second = store.create(["no_display", "beeps"]), store.create(["beeps", "no_display"])
+    assert store.diagnose(first) is store.diagnose(second)
+    store.toggle(second, "beeps")
+    assert store.diagnose(second) == diagnose(["no_display"])
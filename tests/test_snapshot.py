@@ -0,0 +1,85 @@
+import json
+import os
+import pickle
+import random
+import subprocess
+import sys
+
+import pytest
+from experta import Fact
+
+from diagnosis.catalog import SYMPTOM_NAMES
+from diagnosis.knowledge import ComputerDiagnosis
+from diagnosis.snapshot import _LENGTH, MAGIC, SnapshotError, header_for, load_snapshot, save_snapshot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _diagnoses(engine, symptoms):
+    engine.reset()
+    for symptom in symptoms:
+        engine.declare(Fact(symptom=symptom))
+    engine.run()
+    return engine.result()
+
+
+def _write(path, header, payload):
+    header = json.dumps(header).encode()
+    with open(path, "wb") as out:
+        out.write(MAGIC + _LENGTH.pack(len(header)) + header + payload)
+
+
+class _System:
+    def __reduce__(self):
+        return os.system, ("true",)
+
+
+def test_restored_engine_matches_built_engine(tmp_path):
+    path = str(tmp_path / "engine.snap")
+    save_snapshot(path)
+    restored, built = load_snapshot(path), ComputerDiagnosis()
+    rng = random.Random(0)
+    cases = [[], list(SYMPTOM_NAMES)] + [rng.sample(SYMPTOM_NAMES, rng.randint(1, 6)) for _ in range(200)]
+    for case in cases:
+        assert _diagnoses(restored, case) == _diagnoses(built, case), case
+
+
+def test_snapshot_saved_by_the_cli_loads_in_another_process(tmp_path):
+    path = str(tmp_path / "cli.snap")
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    subprocess.run([sys.executable, "-m", "diagnosis.snapshot", "save", path], cwd=ROOT, env=env,
+                   check=True, stdout=subprocess.DEVNULL)
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys; from diagnosis.snapshot import load_snapshot; "
+                               "print(load_snapshot(sys.argv[1]).__class__.__name__)", path],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True)
+    assert loaded.stdout.strip() == "ComputerDiagnosis"
+
+
+def test_foreign_callable_is_refused(tmp_path):
+    path = str(tmp_path / "evil.snap")
+    _write(path, header_for(ComputerDiagnosis), pickle.dumps(_System()))
+    with pytest.raises(SnapshotError):
+        load_snapshot(path)
+
+
+def test_tampered_payload_is_refused(tmp_path):
+    path = str(tmp_path / "tampered.snap")
+    save_snapshot(path)
+    with open(path, "r+b") as handle:
+        handle.seek(-64, os.SEEK_END)
+        handle.write(b"\xff" * 32)
+    with pytest.raises(SnapshotError):
+        load_snapshot(path)
+
+
+def test_snapshot_for_other_rules_is_refused(tmp_path):
+    path = str(tmp_path / "stale.snap")
+    save_snapshot(path)
+    with open(path, "rb") as handle:
+        data = handle.read()
+    length, = _LENGTH.unpack(data[len(MAGIC):len(MAGIC) + _LENGTH.size])
+    payload = data[len(MAGIC) + _LENGTH.size + length:]
+    _write(path, dict(header_for(ComputerDiagnosis), rules="0" * 64), payload)
+    with pytest.raises(SnapshotError, match="other rules"):
+        load_snapshot(path)
@@ -0,0 +1,11 @@
+from diagnosis.telemetry import Reading, TelemetryMonitor
+
+
+def test_update_after_a_time_jump_drops_expired_symptoms():
+    monitor = TelemetryMonitor()
+    first, second = monitor.process([Reading(0, "web-1", "unexpected_shutdown", 1),
+                                     Reading(5000, "web-1", "cpu_temp", 99)])
+    assert first.symptoms == {"sudden_shutdown"}
+    # The shutdown's one-hour window expired before the temperature reading
+    assert second.symptoms == {"high_cpu_temperature", "overheating"}
+    assert monitor.symptoms("web-1") == second.symptoms
@@ -0,0 +1,10 @@
+from diagnosis.verify import verify
+
+
+def test_shipped_knowledge_base_findings():
+    findings, stats = verify(workers=1)
+    assert {(finding.check, finding.subject) for finding in findings} == {
+        ("unreachable", "power_surge_damage"),
+        ("dead-symptom", "random_component_malfunctions"),
+    }
+    assert stats["reading_rules"] == 3